@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_PREFIX = 'version:'
+
+
+def _initial_version():
+    # после вытеснения ключа версия начинается заново со времени,
+    # поэтому она не совпадет ни с одной из прежних
+    return int(time.time() * 1000)
+
+
+def get_versions(*names):
+    """Текущие значения счетчиков поколений, одним обращением к кэшу."""
+    keys = {VERSION_PREFIX + name: name for name in names}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, name in keys.items():
+        if key not in found:
+            initial = _initial_version()
+            if not cache.add(key, initial, None):
+                initial = cache.get(key, initial)
+            found[key] = initial
+        versions[name] = found[key]
+    return versions
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_versions(*names):
+    """Сдвигает поколения: все ключи со старой версией перестают читаться."""
+    for name in names:
+        key = VERSION_PREFIX + name
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+
+
+def bump_versions_on_commit(*names):
+    """
+    Сдвигает поколения сразу и еще раз после фиксации транзакции.
+    Запрос, прочитавший версию до фиксации, видит еще старые данные:
+    сохраненное им попадает под промежуточную версию и не читается.
+    """
+    bump_versions(*names)
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+def delete_on_commit(keys):
+    """Удаляет ключи сразу и еще раз после фиксации транзакции."""
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def tag_page(request, *names):
+    """
+    Помечает страницу поколениями, от которых она зависит. Версии
+    читаются сразу, до выборки данных: сброс во время отрисовки
+    оставит в кэше уже устаревшую запись, а не свежую с новой версией.
+    """
+    tags = getattr(request, 'page_tags', None)
+    if tags is None:
+        tags = request.page_tags = {}
+    names = [name for name in names if name not in tags]
+    if names:
+        tags.update(get_versions(*names))
+    return tags
+
+
+def get_or_recompute(key, compute, timeout, version=None, grace=None,
+                     request=None):
+    """
+    Значение из кэша с защитой от одновременного пересчета.
+
+    После timeout или при смене version значение устаревает, но еще
+    grace секунд хранится в кэше. Пересчитывает его один запрос,
+    взявший короткую блокировку, остальные тем временем получают
+    устаревшее значение. Без значения в кэше считают все.
+
+    Если устаревшее значение отдано, на request ставится serving_stale:
+    такой ответ не кэшируется целиком и уходит без ETag.
+    """
+    if grace is None:
+        grace = settings.CACHE_STALE_GRACE
+    entry = cache.get(key)
+    if entry is not None:
+        entry_version, fresh_until, value = entry
+        if entry_version == version and time.time() < fresh_until:
+            return value
+        lock = f'{key}:lock'
+        if not cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+            if request is not None:
+                request.serving_stale = True
+            return value
+        try:
+            return _recompute(key, compute, timeout, version, grace)
+        finally:
+            cache.delete(lock)
+    return _recompute(key, compute, timeout, version, grace)
+
+
+def _recompute(key, compute, timeout, version, grace):
+    value = compute()
+    cache.set(key, (version, time.time() + timeout, value), timeout + grace)
+    return value
@@ -0,0 +1,241 @@
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_KEY = 'two_tier:stamp'
+# процесс, отставший по журналу сильнее, сбрасывает свой уровень целиком
+LOG_LIMIT = 100
+# блокировки берутся через add и не читаются из памяти, их удаление
+# другим процессам сообщать не нужно
+LOCK_SUFFIX = ':lock'
+
+# локальные уровни общие для всех потоков процесса, как у LocMemCache
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+_missing = object()
+
+
+class LocalTier:
+    """Ограниченный LRU процесса с собственным сроком жизни ключей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.checked = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _missing
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _missing
+            self.entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        # значение хранится сериализованным: объекты из кэша,
+        # например ответы, не должны делиться между запросами
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Кэш из двух уровней: LRU в памяти процесса перед общим кэшем.
+
+    Запись идет в оба уровня, чтение сначала из памяти. delete и incr
+    сдвигают штамп в общем кэше и записывают под его номером
+    измененные ключи. Процесс сверяет штамп не чаще STAMP_INTERVAL
+    секунд и убирает из памяти ключи из пропущенных записей журнала;
+    если запись уже вытеснена, отставание больше LOG_LIMIT или кэш
+    очищен через clear, уровень сбрасывается целиком.
+    Перезапись ключа через set другие процессы видят через LOCAL_TIMEOUT,
+    поэтому изменяемые на месте значения, например версии, меняются
+    через incr.
+
+    OPTIONS: SHARED — алиас общего кэша, MAX_ENTRIES — размер LRU,
+    LOCAL_TIMEOUT — наибольший срок ключа в памяти, STAMP_INTERVAL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED']
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.stamp_interval = options.get('STAMP_INTERVAL', 1)
+        name = location or self.shared_alias
+        with _tiers_lock:
+            if name not in _tiers:
+                _tiers[name] = LocalTier(self._max_entries)
+            self.local = _tiers[name]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _sync(self):
+        """Убирает из памяти ключи, измененные другими процессами."""
+        now = time.monotonic()
+        if now - self.local.checked < self.stamp_interval:
+            return
+        self.local.checked = now
+        stamp = self.shared.get(STAMP_KEY)
+        seen = self.local.stamp
+        if stamp == seen:
+            return
+        self.local.stamp = stamp
+        if stamp is None or seen is None or not 0 < stamp - seen <= LOG_LIMIT:
+            self.local.clear()
+            return
+        log = self.shared.get_many(
+            [f'{STAMP_KEY}:{number}' for number in range(seen + 1, stamp + 1)]
+        )
+        if len(log) < stamp - seen:
+            self.local.clear()
+            return
+        for keys in log.values():
+            self.local.delete_many(keys)
+
+    def _log(self, keys):
+        """Сдвигает штамп и записывает под ним измененные ключи."""
+        keys = [key for key in keys if not key.endswith(LOCK_SUFFIX)]
+        if not keys:
+            return
+        try:
+            stamp = self.shared.incr(STAMP_KEY)
+        except ValueError:
+            self._restart()
+            return
+        # запись нужна, пока живы значения в памяти процессов
+        self.shared.set(
+            f'{STAMP_KEY}:{stamp}', keys,
+            self.local_timeout + self.stamp_interval + 1
+        )
+
+    def _restart(self):
+        # новый штамп не должен совпасть с прежним, записей под ним нет,
+        # и другие процессы сбросят свои уровни целиком
+        self.shared.add(STAMP_KEY, random.getrandbits(62), None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self._sync()
+        value = self.local.get(local_key)
+        if value is not _missing:
+            return value
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missed = []
+        for key in keys:
+            value = self.local.get(self.make_key(key, version))
+            if value is _missing:
+                missed.append(key)
+            else:
+                found[key] = value
+        if missed:
+            shared = self.shared.get_many(missed, version=version)
+            for key, value in shared.items():
+                self.local.set(
+                    self.make_key(key, version), value, self.local_timeout
+                )
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.local.set(
+            self.make_key(key, version), value, self._local_timeout(timeout)
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self.local.set(
+                    self.make_key(key, version), value,
+                    self._local_timeout(timeout)
+                )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version)
+        if self.shared.add(key, value, timeout, version=version):
+            self.local.set(local_key, value, self._local_timeout(timeout))
+            return True
+        # в памяти могло остаться значение, уже замененное в общем кэше
+        self.local.delete(local_key)
+        return False
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        self._sync()
+        if self.local.get(self.make_key(key, version)) is not _missing:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        local_key = self.make_key(key, version)
+        self.local.set(local_key, value, self.local_timeout)
+        self._log([local_key])
+        return value
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version)
+        self.shared.delete(key, version=version)
+        self.local.delete(local_key)
+        self._log([local_key])
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self.make_key(key, version) for key in keys]
+        self.shared.delete_many(keys, version=version)
+        self.local.delete_many(local_keys)
+        self._log(local_keys)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self._restart()
@@ -0,0 +1,70 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+
+from .cache import get_versions
+
+
+class PageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных GET-запросов.
+
+    Кэшируются только страницы, помеченные во view через tag_page().
+    Вместе с ответом хранятся версии его тегов, и запись читается,
+    пока ни один тег не сдвинут сигналами, поэтому срок жизни
+    PAGE_CACHE_TIMEOUT нужен только для вытеснения. Сигналы сдвигают
+    теги еще и после фиксации транзакции: страница, отрисованная
+    во время чужой записи, под новыми тегами не читается.
+
+    Страница с устаревшим фрагментом из get_or_recompute не кэшируется
+    и уходит без ETag: он посчитан по новым версиям и закрепил бы
+    у клиента старое содержимое.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cacheable = self.cacheable(request)
+        if cacheable:
+            key = self.cache_key(request)
+            entry = cache.get(key)
+            if entry is not None:
+                tags, response = entry
+                if get_versions(*tags) == tags:
+                    # ETag сохранен вместе с ответом, 304 отдается без view
+                    return get_conditional_response(
+                        request, etag=response.get('ETag'),
+                        response=response
+                    )
+
+        response = self.get_response(request)
+        if getattr(request, 'serving_stale', False):
+            del response['ETag']
+            return response
+        tags = getattr(request, 'page_tags', None)
+        if cacheable and tags and self.storable(request, response):
+            cache.set(key, (tags, response), settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def cacheable(self, request):
+        # без сессионной куки пользователь анонимен и сессия не читается
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+        )
+
+    def storable(self, request, response):
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
+
+    def cache_key(self, request):
+        url = md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'page:{url}'
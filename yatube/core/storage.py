@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла — хэш его содержимого.
+
+    Одинаковые загрузки ложатся в один файл: повторное сохранение
+    возвращает уже существующее имя, ничего не записывая. Каталог
+    из upload_to и расширение исходного имени сохраняются, файлы
+    раскладываются по подкаталогам из первых символов хэша. Удалять
+    файл можно только когда на него не ссылается ни одна запись.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:] + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хэшем содержимого в имени и сжатыми копиями рядом.
+
+    После collectstatic рядом с каждым сжимаемым файлом лежит .gz,
+    который фронт-прокси отдает сам, например через gzip_static
+    в nginx. Копия сохраняется, только если она заметно меньше.
+    """
+
+    gzip_extensions = (
+        '.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.ico',
+    )
+    # сжатие должно сэкономить хотя бы столько от размера файла
+    gzip_min_ratio = 0.05
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.lower().endswith(self.gzip_extensions):
+                gzip_name = self.compress(name)
+                if gzip_name:
+                    yield name, gzip_name, True
+
+    def compress(self, name):
+        """Пишет name.gz и возвращает его имя, если сжатие имеет смысл."""
+        with self.open(name) as original:
+            content = original.read()
+        # mtime=0: одинаковый файл дает одинаковый архив при каждой сборке
+        compressed = gzip.compress(content, 9, mtime=0)
+        if len(compressed) > len(content) * (1 - self.gzip_min_ratio):
+            return None
+        gzip_name = name + '.gz'
+        if self.exists(gzip_name):
+            self.delete(gzip_name)
+        self._save(gzip_name, ContentFile(compressed))
+        return gzip_name
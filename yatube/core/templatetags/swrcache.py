@@ -0,0 +1,66 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import get_or_recompute
+
+register = template.Library()
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, options):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.options = options
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'"swrcache" tag got a non-integer timeout value: '
+                f'{self.timeout.var!r}'
+            )
+        options = {
+            name: value.resolve(context)
+            for name, value in self.options.items()
+        }
+        if options.get('grace') is not None:
+            options['grace'] = int(options['grace'])
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_recompute(
+            key, lambda: self.nodelist.render(context), timeout,
+            request=context.get('request'), **options
+        )
+
+
+@register.tag
+def swrcache(parser, token):
+    """
+    Как {% cache %}, но устаревший фрагмент пересчитывает один запрос,
+    а остальные до конца пересчета получают прежний:
+
+        {% swrcache 500 sidebar request.user.username version=v grace=60 %}
+        ...
+        {% endswrcache %}
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'"{bits[0]}" tag requires at least 2 arguments.'
+        )
+    options = {}
+    while bits[-1].startswith(('version=', 'grace=')):
+        name, value = bits.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        options,
+    )
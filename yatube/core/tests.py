@@ -0,0 +1,378 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.http import HttpRequest
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import get_or_recompute
+from core.cache_backends import STAMP_KEY, TwoTierCache
+from core.storage import CompressedManifestStaticFilesStorage
+
+# кэш в памяти вместо общего кэша на диске
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'core-tests',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        # два «процесса» с собственными уровнями в памяти
+        self.first = self._process('first')
+        self.second = self._process('second')
+
+    def _process(self, name, **options):
+        cache = TwoTierCache(name, {'OPTIONS': {
+            'SHARED': 'shared', 'STAMP_INTERVAL': 0, **options
+        }})
+        cache.local.clear()
+        return cache
+
+    def test_hot_key_read_from_memory(self):
+        """Повторное чтение ключа не обращается к общему кэшу"""
+        cache = self._process('hot', STAMP_INTERVAL=60)
+        cache.set('key', 'value')
+        cache.get('key')
+        with mock.patch.object(
+            caches['shared'], 'get', side_effect=AssertionError
+        ), mock.patch.object(
+            caches['shared'], 'get_many', side_effect=AssertionError
+        ):
+            self.assertEqual(cache.get('key'), 'value')
+            self.assertEqual(cache.get_many(['key']), {'key': 'value'})
+
+    def test_local_tier_is_bounded(self):
+        """LRU в памяти вытесняет давние ключи, общий кэш их хранит"""
+        cache = self._process('bounded', MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+
+        self.assertEqual(list(cache.local.entries), [
+            cache.make_key('b'), cache.make_key('c')
+        ])
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_local_timeout(self):
+        """Ключ живет в памяти не дольше LOCAL_TIMEOUT"""
+        cache = self._process('expiring', LOCAL_TIMEOUT=0)
+        cache.set('key', 'value')
+        caches['shared'].set('key', 'changed')
+
+        self.assertEqual(cache.get('key'), 'changed')
+
+    def test_invalidation_reaches_other_process(self):
+        """incr, delete и clear одного процесса видны другому"""
+        self.first.set('version', 1)
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('version'), 1)
+        self.assertEqual(self.second.get('key'), 'value')
+
+        self.first.incr('version')
+        self.first.delete('key')
+        self.assertEqual(self.second.get('version'), 2)
+        self.assertIsNone(self.second.get('key'))
+
+        self.first.clear()
+        self.assertIsNone(self.second.get('version'))
+
+    def test_invalidation_by_key(self):
+        """Другой процесс убирает из памяти только измененный ключ"""
+        # первый сдвиг заводит штамп, до него уровень сбрасывается целиком
+        self.first.delete('changed')
+        self.second.get('changed')
+        self.first.set('changed', 'value')
+        self.first.set('kept', 'value')
+        self.second.get('changed')
+        self.second.get('kept')
+
+        self.first.delete('changed')
+        self.assertIsNone(self.second.get('changed'))
+        self.assertIn(self.second.make_key('kept'), self.second.local.entries)
+
+    def test_lock_not_logged(self):
+        """Снятие блокировки не сдвигает штамп"""
+        self.first.set('key', 'value')
+        self.first.delete('key')
+        stamp = caches['shared'].get(STAMP_KEY)
+
+        self.first.add('key:lock', 1)
+        self.first.delete('key:lock')
+        self.assertEqual(caches['shared'].get(STAMP_KEY), stamp)
+
+    def test_missed_log_clears_tier(self):
+        """Без записей журнала уровень процесса сбрасывается целиком"""
+        self.first.set('key', 'value')
+        self.first.delete('key')
+        self.second.set('kept', 'value')
+        self.second.get('kept')
+        caches['shared'].incr(STAMP_KEY)
+
+        self.second.get('other')
+        self.assertEqual(self.second.local.entries, {})
+
+    def test_stamp_polled_by_interval(self):
+        """Штамп сверяется не чаще STAMP_INTERVAL"""
+        cache = self._process('polling', STAMP_INTERVAL=60)
+        cache.get('key')
+        with mock.patch.object(caches['shared'], 'get') as get:
+            get.return_value = None
+            cache.get('key')
+            cache.get('other')
+
+        self.assertNotIn(
+            mock.call('two_tier:stamp'), get.call_args_list
+        )
+
+    def test_values_are_not_shared(self):
+        """Из памяти каждый раз читается отдельная копия значения"""
+        self.first.set('key', ['value'])
+        self.first.get('key').append('changed')
+
+        self.assertEqual(self.first.get('key'), ['value'])
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class StaleWhileRevalidateTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='new')
+
+    def _stale(self, version=1):
+        # часы подменяются только для core.cache, не для бэкенда кэша
+        with mock.patch('core.cache.time') as clock:
+            clock.time.return_value = 0
+            get_or_recompute('key', lambda: 'old', 10, version=version)
+
+    def test_fresh_value_not_recomputed(self):
+        """Свежее значение берется из кэша"""
+        get_or_recompute('key', lambda: 'old', 10)
+
+        self.assertEqual(get_or_recompute('key', self.compute, 10), 'old')
+        self.compute.assert_not_called()
+
+    def test_stale_value_recomputed_once(self):
+        """Устаревшее значение пересчитывает запрос, взявший блокировку"""
+        self._stale()
+
+        self.assertEqual(
+            get_or_recompute('key', self.compute, 10, version=1), 'new'
+        )
+        self.assertEqual(
+            get_or_recompute('key', self.compute, 10, version=1), 'new'
+        )
+        self.compute.assert_called_once()
+
+    def test_stale_value_served_during_recompute(self):
+        """Пока значение пересчитывается, остальные получают прежнее"""
+        self._stale()
+        cache.add('key:lock', 1)
+        request = HttpRequest()
+
+        self.assertEqual(
+            get_or_recompute(
+                'key', self.compute, 10, version=1, request=request
+            ),
+            'old'
+        )
+        self.compute.assert_not_called()
+        self.assertTrue(request.serving_stale)
+
+    def test_new_version_recomputed(self):
+        """Смена версии устаревает значение до истечения срока"""
+        get_or_recompute('key', lambda: 'old', 10, version=1)
+
+        self.assertEqual(
+            get_or_recompute('key', self.compute, 10, version=2), 'new'
+        )
+
+    def test_template_tag(self):
+        """{% swrcache %} пересчитывает фрагмент по версии"""
+        template = Template(
+            '{% load swrcache %}'
+            '{% swrcache 10 fragment name version=version grace=5 %}'
+            '{{ value }}{% endswrcache %}'
+        )
+
+        def render(**context):
+            return template.render(Context(context))
+
+        self.assertEqual(render(name='a', version=1, value='old'), 'old')
+        self.assertEqual(render(name='a', version=1, value='new'), 'old')
+        self.assertEqual(render(name='b', version=1, value='new'), 'new')
+        self.assertEqual(render(name='a', version=2, value='new'), 'new')
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR), CACHES=SHARED_CACHE
+)
+class MediaViewTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(f'{settings.MEDIA_ROOT}/file.txt', 'wb') as file:
+            file.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def _get(self, path='/media/file.txt', **headers):
+        return self.client.get(path, **headers)
+
+    def test_whole_file_cached_long(self):
+        """Файл отдается целиком с долгим кэшированием"""
+        response = self._get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_not_modified(self):
+        """Если файл не менялся, браузер получает 304"""
+        last_modified = self._get()['Last-Modified']
+
+        response = self._get(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        """Range отдает только запрошенную часть"""
+        ranges = {
+            'bytes=2-4': (b'234', 'bytes 2-4/10'),
+            'bytes=7-': (b'789', 'bytes 7-9/10'),
+            'bytes=-2': (b'89', 'bytes 8-9/10'),
+            'bytes=8-100': (b'89', 'bytes 8-9/10'),
+        }
+        for header, (content, content_range) in ranges.items():
+            with self.subTest(header=header):
+                response = self._get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    b''.join(response.streaming_content), content
+                )
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(
+                    response['Content-Length'], str(len(content))
+                )
+
+    def test_unsatisfiable_range(self):
+        """Диапазон за концом файла дает 416"""
+        response = self._get(HTTP_RANGE='bytes=10-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch(self):
+        """Устаревший If-Range отдает файл целиком"""
+        response = self._get(
+            HTTP_RANGE='bytes=2-4',
+            HTTP_IF_RANGE='Thu, 01 Jan 1970 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected/')
+    def test_accel_redirect(self):
+        """При X-Accel-Redirect файл отдает nginx"""
+        response = self._get()
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/file.txt')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected/')
+    def test_accel_redirect_encoded(self):
+        """Имя файла в X-Accel-Redirect кодируется как часть URI"""
+        with open(f'{settings.MEDIA_ROOT}/фото 1.txt', 'wb') as file:
+            file.write(b'0')
+        response = self._get('/media/фото 1.txt')
+
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected/%D1%84%D0%BE%D1%82%D0%BE%201.txt'
+        )
+
+    @override_settings(MEDIA_SENDFILE=True)
+    def test_sendfile(self):
+        """При X-Sendfile передается путь к файлу на диске"""
+        response = self._get()
+
+        self.assertEqual(
+            response['X-Sendfile'], f'{settings.MEDIA_ROOT}/file.txt'
+        )
+
+    def test_missing_and_outside(self):
+        """Несуществующие файлы и пути вне MEDIA_ROOT не отдаются"""
+        for path in ('/media/missing.txt', '/media/../manage.py', '/media/'):
+            with self.subTest(path=path):
+                self.assertEqual(self._get(path).status_code, 404)
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class StaticPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        os.makedirs(os.path.join(source, 'img'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as file:
+            file.write('body { background: url("../img/logo.png"); }\n' * 50)
+        with open(os.path.join(source, 'img', 'logo.png'), 'wb') as file:
+            file.write(os.urandom(512))
+        self.root = root
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'
+            ),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.storage = CompressedManifestStaticFilesStorage()
+
+    def test_hashed_urls_in_templates(self):
+        """{% static %} отдает имя с хэшем содержимого"""
+        rendered = Template(
+            "{% load static %}{% static 'img/logo.png' %}"
+        ).render(Context())
+
+        self.assertRegex(rendered, r'^/static/img/logo\.\w{12}\.png$')
+
+    def test_gzip_siblings(self):
+        """Сжимаемые файлы получают .gz, картинки — нет"""
+        css = self.storage.stored_name('css/site.css')
+        with self.storage.open(css) as original:
+            content = original.read()
+        with self.storage.open(css + '.gz') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), content)
+        # ссылки внутри CSS тоже ведут на имена с хэшем
+        self.assertIn(
+            self.storage.stored_name('img/logo.png').split('/')[-1],
+            content.decode()
+        )
+        self.assertFalse(self.storage.exists(
+            self.storage.stored_name('img/logo.png') + '.gz'
+        ))
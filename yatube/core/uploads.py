@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загрузку сразу во временный файл, не держа ее в памяти.
+    На диск попадает не больше UPLOAD_MAX_BYTES, остаток намеренно
+    дочитывается и только считается: size файла остается полным,
+    и форма сообщает точную ошибку о размере вместо «битой картинки».
+    SkipFile и StopUpload тоже дочитывают тело, но оставляют форму без
+    файла, а StopUpload со сбросом соединения не дает ответить вовсе.
+    Размер всего тела запроса ограничивает фронтовой веб-сервер.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.UPLOAD_MAX_BYTES:
+            self.file.write(raw_data)
@@ -1,5 +1,21 @@
 # core/views.py
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 def page_not_found(request, exception):
@@ -12,3 +28,125 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+class FileRange:
+    """Часть открытого файла, которую FileResponse читает до конца."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Первый и последний байт из заголовка Range. None, если заголовок
+    не разобран: тогда отдается весь файл. Несколько диапазонов
+    не поддерживаются.
+    """
+    match = RANGE_RE.match(header or '')
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        if end and int(end) < start:
+            return None
+        end = min(int(end), size - 1) if end else size - 1
+    elif end:
+        start = max(size - int(end), 0) if int(end) else size
+        end = size - 1
+    else:
+        return None
+    return start, end
+
+
+def _cache_headers(response, stat):
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    )
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _proxy_response(path, fullpath, content_type):
+    """Пустой ответ, по которому файл отдает фронт-прокси."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # заголовок — URI: не-ASCII и спецсимволы в имени кодируются
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(path)
+        )
+    else:
+        response['X-Sendfile'] = str(fullpath)
+    return response
+
+
+@require_safe
+def media(request, path):
+    """
+    Отдает загруженный файл. Все файлы в MEDIA_ROOT публичные: view
+    только не выпускает путь за его пределы, а сам файл по возможности
+    отдает фронт-прокси.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    if not fullpath.is_file():
+        raise Http404('Файл не найден')
+    stat = fullpath.stat()
+    content_type, encoding = mimetypes.guess_type(str(fullpath))
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_SENDFILE:
+        # Range и условные запросы прокси обработает сам
+        return _cache_headers(
+            _proxy_response(path, fullpath, content_type), stat
+        )
+
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime, stat.st_size
+    ):
+        return _cache_headers(HttpResponseNotModified(), stat)
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != http_date(stat.st_mtime):
+        # файл изменился с прошлой загрузки части: отдается целиком
+        byte_range = None
+    if byte_range is None:
+        # целый файл сервер приложений может отдать через sendfile
+        response = FileResponse(
+            fullpath.open('rb'), content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        if start >= stat.st_size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        length = end - start + 1
+        response = FileResponse(
+            FileRange(fullpath.open('rb'), start, length),
+            status=206, content_type=content_type
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return _cache_headers(response, stat)
@@ -1,9 +1,64 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db.models import Q
+
+from . import search
+from .models import Comment, Follow, Group, Post, User
+from .paginator import CappedCountPaginator
+
+
+def prefix_range(field, prefix):
+    """
+    «Начинается с prefix» диапазоном по индексу: LIKE в SQLite
+    регистронезависим и индекс по полю не использует.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+class IndexedSearchAdmin(admin.ModelAdmin):
+    """
+    Поиск в админке только по индексам: текст ищется в таблице FTS5
+    text_index, пользователи из username_fields — по префиксу имени
+    с учетом регистра. Найденные строки считаются не дальше
+    ADMIN_COUNT_LIMIT, полный размер таблицы рядом с ними не считается.
+    """
+    text_index = None
+    username_fields = ()
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        paginator = self.paginator
+        if request.GET.get(SEARCH_VAR, '').strip():
+            paginator = CappedCountPaginator
+        return paginator(queryset, per_page, orphans, allow_empty_first_page)
 
-from .models import Comment, Follow, Group, Post
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        conditions = []
+        if self.text_index is not None:
+            condition = self.text_index.matches(term)
+            if condition is not None:
+                conditions.append(condition)
+        if self.username_fields and len(term.split()) == 1:
+            users = User.objects.filter(
+                prefix_range('username', term)
+            ).values('pk')
+            conditions.extend(
+                Q(**{f'{field}__in': users}) for field in self.username_fields
+            )
+        if not conditions:
+            return queryset.none(), False
+        return queryset.filter(reduce(or_, conditions)), False
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,6 +67,8 @@ class PostAdmin(admin.ModelAdmin):
         'created',)
     list_editable = ('group',)
     search_fields = ('text',)
+    text_index = search.posts
+    username_fields = ('author',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
@@ -29,27 +86,30 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchAdmin):
     list_display = (
         'pk',
         'text',
         'author',
     )
     list_editable = ('text',)
-    search_fields = ('author',)
+    search_fields = ('text', 'author__username')
+    text_index = search.comments
+    username_fields = ('author',)
     list_filter = ()
     # Это свойство сработает для всех колонок: где пусто — там будет эта строка
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(IndexedSearchAdmin):
     list_display = (
         'pk',
         'user',
         'author',
     )
 
-    search_fields = ('author',)
+    search_fields = ('user__username', 'author__username')
+    username_fields = ('user', 'author')
     list_filter = ('author',)
     # Это свойство сработает для всех колонок: где пусто — там будет эта строка
     empty_value_display = '-пусто-'
@@ -0,0 +1,143 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import get_or_recompute, get_version, get_versions
+
+from . import feeds
+from .models import TimelineEntry
+
+INDEX_VERSION = 'index'
+
+GROUPS_VERSION = 'groups'
+
+USERS_VERSION = 'users'
+
+CARD_TEMPLATE = 'includes/post.html'
+
+
+def post_version(post_id):
+    return f'post:{post_id}'
+
+
+def user_version(user_id):
+    return f'user:{user_id}'
+
+
+def group_version(group_id):
+    return f'group:{group_id}'
+
+
+def feed_version(user_id):
+    return f'feed:{user_id}'
+
+
+def author_posts_version(author_id):
+    return f'author_posts:{author_id}'
+
+
+def group_posts_version(group_id):
+    return f'group_posts:{group_id}'
+
+
+def comments_version(post_id):
+    return f'comments:{post_id}'
+
+
+def follows_version(user_id):
+    return f'follows:{user_id}'
+
+
+def post_list_versions(post):
+    """Поколения всех лент и страниц, где показан пост."""
+    names = [
+        INDEX_VERSION,
+        post_version(post.pk),
+        author_posts_version(post.author_id),
+    ]
+    if post.group_id is not None:
+        names.append(group_posts_version(post.group_id))
+    return names
+
+
+def follow_feed_state(request):
+    """
+    Версия ленты подписок и pulled-авторы читателя, один раз на запрос.
+
+    Версия меняется при подписке и отписке, с новыми и удаленными
+    записями материализованной ленты, с постами pulled-авторов и при
+    изменении групп. Правки постов и профилей остальных авторов
+    попадают в закэшированную ленту через FOLLOW_CACHE_TIMEOUT: иначе
+    каждый запрос читал бы поколения всех отслеживаемых авторов.
+    """
+    state = getattr(request, 'follow_feed', None)
+    if state is not None:
+        return state
+    user_id = request.user.pk
+    version = get_version(feed_version(user_id))
+    # подписки меняют версию сразу, смена pulled-авторов видна за минуту
+    pulled = get_or_recompute(
+        f'pulled_authors:{user_id}',
+        lambda: feeds.pulled_authors(request.user),
+        settings.PULLED_AUTHORS_TIMEOUT,
+        version=version,
+        request=request
+    )
+    names = [GROUPS_VERSION] + [
+        author_posts_version(author_id) for author_id in pulled
+    ]
+    versions = get_versions(*names)
+    timeline = TimelineEntry.objects.filter(user_id=user_id).aggregate(
+        last=Max('pk'), size=Count('pk')
+    )
+    digest = md5(':'.join(map(str, [
+        timeline['last'], timeline['size'],
+        *(versions[name] for name in names)
+    ])).encode()).hexdigest()
+    state = request.follow_feed = (f'{user_id}:{version}:{digest}', pulled)
+    return state
+
+
+def card_versions(post):
+    """Поколения, от которых зависит карточка: пост, автор и группа."""
+    return (
+        post_version(post.pk),
+        user_version(post.author_id),
+        group_version(post.group_id),
+    )
+
+
+def render_cards(posts, template_name=CARD_TEMPLATE):
+    """
+    HTML карточек постов. Версии и готовые карточки читаются из кэша
+    двумя обращениями, отрисовываются только промахи.
+    """
+    posts = list(posts)
+    versions = get_versions(*{
+        name for post in posts for name in card_versions(post)
+    })
+    keys = [
+        ':'.join(
+            ['post_card', template_name]
+            + [str(versions[name]) for name in card_versions(post)]
+            + [str(post.pk)]
+        )
+        for post in posts
+    ]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(
+                template_name, {'post': post}
+            )
+        cards.append(mark_safe(html))
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
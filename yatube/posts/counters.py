@@ -0,0 +1,117 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Group
+
+
+def _change(user_id, **deltas):
+    # после массовых операций без сигналов счетчик не уходит в минус.
+    # Недостающую строку досчитает stats при чтении: создавать ее здесь
+    # нельзя, пользователь может удаляться в этой же транзакции
+    AuthorStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def _change_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=Greatest(F('posts_count') + delta, 0)
+        )
+
+
+def stats(user):
+    """Счетчики пользователя; недостающая строка досчитывается."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        reconcile(users=[user.pk])
+        return AuthorStats.objects.get(user=user)
+
+
+def user_created(user):
+    AuthorStats.objects.get_or_create(user=user)
+
+
+def user_deleting(user):
+    """
+    Удаляет счетчики пользователя до каскада: обновления от удаления
+    его постов и подписок их уже не находят, а откат удаления вернет
+    строку вместе с пользователем.
+    """
+    AuthorStats.objects.filter(user_id=user.pk).delete()
+
+
+def post_created(post):
+    _change(post.author_id, posts_count=1)
+    _change_group(post.group_id, 1)
+
+
+def post_changed(post):
+    old_group_id = getattr(post, 'loaded_group_id', post.group_id)
+    if old_group_id != post.group_id:
+        _change_group(old_group_id, -1)
+        _change_group(post.group_id, 1)
+
+
+def post_deleted(post):
+    _change(post.author_id, posts_count=-1)
+    _change_group(post.group_id, -1)
+
+
+def follow_created(follow):
+    _change(follow.user_id, following_count=1)
+    _change(follow.author_id, followers_count=1)
+
+
+def follow_deleted(follow):
+    _change(follow.user_id, following_count=-1)
+    _change(follow.author_id, followers_count=-1)
+
+
+def followers(user_id):
+    return AuthorStats.objects.filter(user_id=user_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос: число строк model, у которых field ссылается на outer."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile(users=None, apps=global_apps):
+    """
+    Пересчитывает счетчики по фактическим строкам. Без users
+    пересчитываются все пользователи и группы.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    stats_model = apps.get_model('posts', 'AuthorStats')
+
+    rows = stats_model.objects.all()
+    if users is None:
+        apps.get_model('posts', 'Group').objects.update(
+            posts_count=_count(Post, 'group')
+        )
+        users = apps.get_model(settings.AUTH_USER_MODEL).objects.filter(
+            stats__isnull=True
+        ).values_list('pk', flat=True)
+    else:
+        rows = rows.filter(user_id__in=users)
+    stats_model.objects.bulk_create(
+        [stats_model(user_id=user_id) for user_id in users],
+        ignore_conflicts=True
+    )
+    rows.update(
+        posts_count=_count(Post, 'author', 'user'),
+        followers_count=_count(Follow, 'author', 'user'),
+        following_count=_count(Follow, 'user', 'user'),
+    )
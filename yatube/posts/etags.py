@@ -0,0 +1,95 @@
+"""
+Валидаторы страниц для условных GET-запросов. ETag собирается из
+поколений кэша, от которых зависит страница, без отрисовки шаблона.
+Пользователь и CSRF-кука входят в ETag: авторизованный получает 304
+только на копию, отрисованную для него и с действующим токеном форм.
+"""
+from hashlib import md5
+
+from django.middleware.csrf import get_token
+
+from core.cache import get_versions
+
+from . import lookups
+from .cache import (GROUPS_VERSION, INDEX_VERSION, USERS_VERSION,
+                    author_posts_version, comments_version,
+                    follow_feed_state, follows_version, group_posts_version,
+                    group_version, post_version, user_version)
+from .models import Post
+
+
+def csrf_cookie(request):
+    """
+    Значение CSRF-куки, которое получит клиент. Формы есть только
+    на страницах авторизованных, для них кука выдается заранее,
+    чтобы ETag первого ответа совпал со следующими.
+    """
+    if not request.user.is_authenticated:
+        return None
+    get_token(request)
+    return request.META['CSRF_COOKIE']
+
+
+def make_etag(request, *names, extra=()):
+    versions = get_versions(*names)
+    parts = [
+        request.user.pk, csrf_cookie(request), *extra,
+    ] + [versions[name] for name in names]
+    return md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def index(request):
+    return make_etag(request, INDEX_VERSION)
+
+
+def group_posts(request, slug):
+    group_id = lookups.group_id(slug)
+    if group_id is None:
+        return None
+    return make_etag(
+        request,
+        group_version(group_id),
+        group_posts_version(group_id),
+        USERS_VERSION
+    )
+
+
+def profile(request, username):
+    author_id = lookups.user_id(username)
+    if author_id is None:
+        return None
+    return make_etag(
+        request,
+        user_version(author_id),
+        author_posts_version(author_id),
+        follows_version(author_id),
+        GROUPS_VERSION
+    )
+
+
+def post_detail(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return None
+    return make_etag(
+        request,
+        post_version(post_id),
+        user_version(post['author_id']),
+        group_version(post['group_id']),
+        author_posts_version(post['author_id']),
+        comments_version(post_id),
+        USERS_VERSION
+    )
+
+
+def comments(request, post_id):
+    return make_etag(request, comments_version(post_id), USERS_VERSION)
+
+
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return None
+    version, _ = follow_feed_state(request)
+    return make_etag(request, extra=[version])
@@ -0,0 +1,234 @@
+"""
+Лента подписок устроена гибридно: посты обычных авторов раскладываются
+по TimelineEntry подписчиков при записи, а посты авторов, у которых
+больше FEED_FANOUT_MAX_FOLLOWERS подписчиков (PulledAuthor), читаются
+при показе ленты и сливаются с ней по created.
+"""
+import heapq
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from . import counters
+from .models import AuthorStats, Follow, Post, PulledAuthor, TimelineEntry
+from .paginator import CursorPaginator, beyond, keyset
+
+POST_KEY = ('created', 'pk')
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Паджинатор ленты подписок: k-way слияние материализованной ленты
+    с последними постами pulled-авторов.
+
+    Посты всех pulled-авторов читаются одним запросом. Если страница
+    ленты заполнена, он ограничен и с другой стороны ее крайней
+    строкой: более далекие посты на страницу все равно не попадут.
+    """
+    key = ('created', 'post_id')
+
+    def __init__(self, object_list, per_page, pulled_authors=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.pulled_authors = list(pulled_authors)
+        self.pulled = Post.objects.filter(
+            author_id__in=self.pulled_authors
+        ).select_related('author', 'group').order_by('-created', '-pk')
+
+    def row_key(self, row):
+        return row.created, row.pk
+
+    def _merge(self, streams):
+        merged = heapq.merge(*streams, key=self.row_key, reverse=True)
+        seen = set()
+        rows = []
+        # посты автора, ставшего pulled, могут остаться и в ленте
+        for post in merged:
+            if post.pk not in seen:
+                seen.add(post.pk)
+                rows.append(post)
+        return rows
+
+    def _pulled_within(self, rows, newer, limit):
+        """Посты pulled-авторов, которые могут попасть между rows."""
+        if len(rows) < limit:
+            return self.pulled
+        # rows идут от новых к старым, нужен край, дальний от курсора
+        edge = rows[0] if newer else rows[-1]
+        return beyond(self.pulled, POST_KEY, edge, not newer)
+
+    def seek(self, cursor, newer, limit):
+        posts = [
+            entry.post for entry in
+            keyset(self.object_list, self.key, cursor, newer, limit)
+        ]
+        if not self.pulled_authors:
+            return posts
+        pulled = keyset(
+            self._pulled_within(
+                [self.row_key(post) for post in posts], newer, limit
+            ),
+            POST_KEY, cursor, newer, limit
+        )
+        rows = self._merge([posts, pulled])
+        return rows[-limit:] if newer else rows[:limit]
+
+    def slice(self, offset, limit):
+        if not self.pulled_authors:
+            return [entry.post for entry in super().slice(offset, limit)]
+        if offset:
+            # целиком читаются только строки страницы, до нее — ключи
+            cursor = self.boundary(offset)
+            if cursor is None:
+                return []
+            return self.seek(cursor, newer=False, limit=limit)
+        posts = [entry.post for entry in self.object_list[:limit]]
+        pulled = self._pulled_within(
+            [self.row_key(post) for post in posts], False, limit
+        )
+        return self._merge([posts, list(pulled[:limit])])[:limit]
+
+    def boundary(self, offset):
+        if not self.pulled_authors:
+            return super().boundary(offset)
+        keys = list(self.object_list.values_list(*self.key)[:offset])
+        pulled = self._pulled_within(keys, False, offset).values_list(
+            *POST_KEY
+        )[:offset]
+        seen = set()
+        for key in heapq.merge(keys, pulled, reverse=True):
+            seen.add(key)
+            if len(seen) == offset:
+                return key
+        return None
+
+
+def timeline(user):
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+
+
+def pulled_authors(user):
+    return list(
+        PulledAuthor.objects.filter(
+            author__following__user=user
+        ).values_list('author_id', flat=True)
+    )
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def prune(user_ids=None):
+    """
+    Обрезает до TIMELINE_MAX_ENTRIES записей ленты, переросшие предел.
+    Все ленты обрезаются одним запросом, записи нумеруются только
+    в переросших; без user_ids проверяются ленты всех пользователей.
+    """
+    limit = settings.TIMELINE_MAX_ENTRIES
+    timelines = TimelineEntry.objects.all()
+    if user_ids is not None:
+        timelines = timelines.filter(user_id__in=user_ids)
+    overgrown = timelines.values('user_id').annotate(
+        size=Count('pk')
+    ).filter(size__gt=limit).values('user_id')
+    ranked = TimelineEntry.objects.filter(user_id__in=overgrown).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('created').desc(), F('post_id').desc()]
+        )
+    ).values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TimelineEntry._meta.db_table} WHERE id IN ('
+            f'SELECT id FROM ({sql}) ranked WHERE position > %s)',
+            (*params, limit)
+        )
+
+
+def fan_out(post):
+    """
+    Раскладывает новый пост по лентам подписчиков автора. Ленты,
+    переросшие предел, обрезает команда prune_timelines: проверка
+    всех лент подписчиков слишком дорога для запроса с постом.
+    """
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, created=post.created)
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def follow(user_id, author_id):
+    """
+    Добавляет в ленту подписчика последние посты нового автора.
+    Автор, перешагнувший порог подписчиков, становится pulled.
+    """
+    if is_pulled(author_id):
+        return
+    if counters.followers(author_id) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        PulledAuthor.objects.get_or_create(author_id=author_id)
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-created', '-pk'
+    ).values_list('pk', 'created')[:settings.TIMELINE_MAX_ENTRIES]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, created=created)
+            for pk, created in posts
+        ],
+        ignore_conflicts=True
+    )
+    prune([user_id])
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def update_pulled_authors():
+    """
+    Пересчитывает набор pulled-авторов по числу подписчиков.
+    Понижение автора обратно до рассылки при записи происходит только
+    здесь, поэтому после него ленты нужно пересобрать.
+    """
+    heavy = set(
+        AuthorStats.objects.filter(
+            followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('user_id', flat=True)
+    )
+    PulledAuthor.objects.exclude(author__in=heavy).delete()
+    PulledAuthor.objects.bulk_create(
+        [PulledAuthor(author_id=author_id) for author_id in heavy],
+        ignore_conflicts=True
+    )
+
+
+@transaction.atomic
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user_id=user_id,
+        author__pulled_feed__isnull=True
+    ).order_by('-created', '-pk').values_list(
+        'pk', 'created'
+    )[:settings.TIMELINE_MAX_ENTRIES]
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(user_id=user_id, post_id=pk, created=created)
+        for pk, created in posts
+    )
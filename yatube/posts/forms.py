@@ -1,6 +1,9 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Comment, Post
 
 User = get_user_model()
@@ -19,6 +22,25 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        images.check_upload(image)
+        return images.normalize(image)
+
+    def clean(self):
+        upload = self.files.get('image')
+        if upload is not None and 'image' in self._errors:
+            # обрезанный или слишком большой файл поле считает битым,
+            # а лимиты дают точную причину
+            try:
+                images.check_upload(upload)
+            except ValidationError as error:
+                del self._errors['image']
+                self.add_error('image', error)
+        return super().clean()
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,107 @@
+"""Обработка загруженных картинок постов."""
+from base64 import b64encode
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# сторона заглушки: картинка около 300 байт, растягивается размытием
+PLACEHOLDER_SIZE = 16
+
+MB = 1024 * 1024
+
+# форматы, которые перекодируются без метаданных, и параметры записи
+REENCODED_FORMATS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+# цветовой профиль и прозрачность — часть изображения, остальное
+# в info при перекодировании отбрасывается как метаданные
+IMAGE_INFO = ('icc_profile', 'transparency')
+
+
+def describe(file):
+    """
+    Размеры картинки и крошечная заглушка в виде data: URI,
+    вычисленные за одно чтение файла.
+    """
+    with Image.open(file) as image:
+        width, height = image.size
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        preview = image.convert('RGB')
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=40)
+    placeholder = 'data:image/jpeg;base64,' + b64encode(
+        buffer.getvalue()
+    ).decode()
+    return width, height, placeholder
+
+
+def check_upload(upload):
+    """
+    Проверяет размер файла и число пикселей по заголовку картинки,
+    не декодируя ее целиком.
+    """
+    limit = settings.UPLOAD_MAX_BYTES
+    if upload.size > limit:
+        raise ValidationError(
+            'Файл весит %(size).1f МБ, можно не больше %(limit).1f МБ',
+            code='file_too_large',
+            params={'size': upload.size / MB, 'limit': limit / MB},
+        )
+    limit = settings.POST_IMAGE_MAX_PIXELS
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        width = height = None
+    except Exception:
+        # формат картинки проверяет само поле формы
+        return
+    finally:
+        upload.seek(0)
+    if width is None or width * height > limit:
+        raise ValidationError(
+            'Картинка больше %(limit).0f мегапикселей',
+            code='too_many_pixels',
+            params={'limit': limit / 10 ** 6},
+        )
+
+
+def normalize(upload):
+    """
+    Поворачивает картинку по EXIF и удаляет метаданные за одно
+    перекодирование во временный файл. GIF остается как есть,
+    чтобы не потерять анимацию.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        fmt = image.format
+        if fmt not in REENCODED_FORMATS:
+            upload.seek(0)
+            return upload
+        info = {
+            key: image.info[key] for key in IMAGE_INFO if key in image.info
+        }
+        image = ImageOps.exif_transpose(image)
+    image.info = info
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    # небольшой результат остается в памяти, крупный уходит на диск
+    output = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    options = REENCODED_FORMATS[fmt]
+    if 'icc_profile' in info:
+        # WebP берет профиль только из параметров записи
+        options = {**options, 'icc_profile': info['icc_profile']}
+    image.save(output, fmt, **options)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(output, upload.name, Image.MIME[fmt], size)
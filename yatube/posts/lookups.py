@@ -0,0 +1,111 @@
+"""
+Кэш поиска групп по slug и пользователей по username.
+
+Имя отображается в id отдельным ключом: он сбрасывается сигналами
+при переименовании и удалении, а неизвестные имена запоминаются
+на LOOKUP_MISS_TIMEOUT. Сам объект кэшируется по id и версиям,
+которые сдвигаются при его изменении, поэтому отдельного сброса
+не требует. В кэш попадают только поля, нужные страницам: пароль
+пользователя в общий кэш не пишется.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from core.cache import get_versions
+
+from .cache import group_posts_version, group_version, user_version
+from .models import Group, User
+
+# id неизвестного имени: None в кэше неотличим от промаха
+NOT_FOUND = 0
+
+
+def group_slug_key(slug):
+    return f'group_slug:{slug}'
+
+
+def username_key(username):
+    return f'username:{username}'
+
+
+def _remember(key, pk):
+    timeout = (
+        settings.LOOKUP_CACHE_TIMEOUT if pk else settings.LOOKUP_MISS_TIMEOUT
+    )
+    cache.set(key, pk or NOT_FOUND, timeout)
+
+
+def _lookup_id(key, queryset):
+    pk = cache.get(key)
+    if pk is None:
+        pk = queryset.values_list('pk', flat=True).first()
+        _remember(key, pk)
+    return pk or None
+
+
+def group_id(slug):
+    return _lookup_id(group_slug_key(slug), Group.objects.filter(slug=slug))
+
+
+def user_id(username):
+    return _lookup_id(
+        username_key(username), User.objects.filter(username=username)
+    )
+
+
+def _instance_key(model, pk, versions):
+    return ':'.join([model._meta.label_lower, str(pk)] + versions)
+
+
+def _get_or_404(queryset, name_key, version_names, fields):
+    """
+    Объект по имени. При пустом кэше поля fields читаются одним
+    запросом по имени, дальше из кэша по id и версиям. Остальные
+    поля объект дочитывает из базы при обращении к ним.
+    """
+    model = queryset.model
+    # from_db ждет значения в порядке полей модели, первым идет id
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if field.primary_key or field.attname in fields
+    ]
+    pk = cache.get(name_key)
+    values = None
+    if pk is None:
+        values = queryset.values_list(*fields).first()
+        pk = values and values[0]
+        _remember(name_key, pk)
+    if not pk:
+        raise Http404(f'{model._meta.object_name} не найден')
+
+    names = version_names(pk)
+    versions = get_versions(*names)
+    key = _instance_key(model, pk, [str(versions[name]) for name in names])
+    if values is None:
+        values = cache.get(key)
+        if values is not None:
+            return model.from_db(queryset.db, fields, values)
+        values = model.objects.filter(pk=pk).values_list(*fields).first()
+        if values is None:
+            cache.delete(name_key)
+            raise Http404(f'{model._meta.object_name} не найден')
+    cache.set(key, values, settings.LOOKUP_CACHE_TIMEOUT)
+    return model.from_db(queryset.db, fields, values)
+
+
+def get_group_or_404(slug):
+    """Группа по slug; число постов в ней обновляется вместе с лентой."""
+    return _get_or_404(
+        Group.objects.filter(slug=slug), group_slug_key(slug),
+        lambda pk: [group_version(pk), group_posts_version(pk)],
+        ['title', 'slug', 'description', 'posts_count']
+    )
+
+
+def get_user_or_404(username):
+    return _get_or_404(
+        User.objects.filter(username=username), username_key(username),
+        lambda pk: [user_version(pk)],
+        ['username', 'first_name', 'last_name']
+    )
@@ -0,0 +1,47 @@
+import posixpath
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов, загруженные до хранилища по хэшу '
+        'содержимого: одинаковые файлы сливаются в один, прежние копии '
+        'и их миниатюры удаляются'
+    )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        moved = 0
+        for name in list(names):
+            try:
+                with default_storage.open(name) as content:
+                    new_name = field.storage.save(
+                        field.generate_filename(
+                            None, posixpath.basename(name)
+                        ),
+                        content
+                    )
+            except (OSError, SuspiciousFileOperation):
+                self.stderr.write(f'Не удалось прочитать {name}')
+                continue
+            if new_name == name:
+                continue
+            Post.objects.filter(image=name).update(image=new_name)
+            # миниатюры прежнего файла записаны за хранилищем по умолчанию
+            thumbnails.release(name, default_storage)
+            # update не шлет сигналов: ленты с постами обновит генерация
+            for post in Post.objects.filter(image=new_name).only(
+                'pk', 'author_id', 'group_id', 'image'
+            ):
+                thumbnails.schedule(post)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f'Перенесено файлов: {moved}'))
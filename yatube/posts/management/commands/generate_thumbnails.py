@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие миниатюры картинок постов, например после '
+        'перезапуска, при котором потерялась очередь фоновых задач'
+    )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        generated = 0
+        for name in list(names):
+            if not thumbnails.missing(name):
+                continue
+            # картинка общая: обновляются страницы всех постов с ней
+            for post in Post.objects.filter(image=name).only(
+                'pk', 'author_id', 'group_id', 'image'
+            ):
+                thumbnails.generate(post, name)
+            generated += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Картинок с новыми миниатюрами: {generated}')
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = 'Обрезает ленты подписок, переросшие TIMELINE_MAX_ENTRIES'
+
+    def handle(self, *args, **options):
+        feeds.prune()
+        self.stdout.write(self.style.SUCCESS('Ленты подписок обрезаны'))
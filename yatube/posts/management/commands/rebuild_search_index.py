@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает поисковые индексы постов и комментариев частями: '
+        'каждая часть пишется короткой транзакцией и не блокирует '
+        'новые записи надолго'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='сколько записей переиндексировать за одну транзакцию'
+        )
+
+    def rebuild(self, index, batch_size):
+        ids = index.model.objects.order_by('pk').values_list('pk', flat=True)
+        first_id = 0
+        indexed = 0
+        while True:
+            batch = list(ids.filter(pk__gte=first_id)[:batch_size])
+            if not batch:
+                break
+            # записи, удаленные между частями, выпадают из диапазона
+            with transaction.atomic():
+                index.reindex_range(first_id, batch[-1])
+            indexed += len(batch)
+            first_id = batch[-1] + 1
+        with transaction.atomic():
+            # записи удаленных строк за последним id
+            index.unindex_from(first_id)
+            index.optimize()
+        return indexed
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Поисковый индекс есть только на SQLite')
+        for index in search.INDEXES:
+            indexed = self.rebuild(index, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{index.model._meta.verbose_name_plural}: '
+                f'проиндексировано {indexed}'
+            ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает pulled-авторов и пересобирает ленты подписок с нуля'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, чью ленту нужно пересобрать'
+        )
+
+    def handle(self, *args, **options):
+        feeds.update_pulled_authors()
+        users = options['users']
+        if users is None:
+            TimelineEntry.objects.exclude(
+                user__in=Follow.objects.values('user')
+            ).delete()
+            users = Follow.objects.values_list(
+                'user', flat=True
+            ).distinct().order_by('user').iterator()
+        rebuilt = 0
+        for user_id in users:
+            feeds.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {rebuilt}')
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов и подписок по фактическим данным'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, чьи счетчики нужно пересчитать'
+        )
+
+    def handle(self, *args, **options):
+        counters.reconcile(users=options['users'])
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
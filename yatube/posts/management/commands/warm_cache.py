@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from posts.models import AuthorStats, Group, Post
+from posts.paginator import encode_cursor
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш после выкладки: первые страницы главной, '
+        'самые активные группы и самые популярные профили'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='сколько первых страниц главной прогреть'
+        )
+        parser.add_argument(
+            '--groups', type=int, default=10,
+            help='сколько групп с наибольшим числом постов прогреть'
+        )
+        parser.add_argument(
+            '--profiles', type=int, default=10,
+            help='сколько профилей с наибольшим числом подписчиков прогреть'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='число параллельных запросов'
+        )
+        parser.add_argument(
+            '--host', default=settings.ALLOWED_HOSTS[0],
+            help='хост, под которым страницы попадут в кэш страниц'
+        )
+        parser.add_argument(
+            '--secure', action='store_true',
+            help='прогревать страницы, открываемые по https'
+        )
+
+    def index_urls(self, pages):
+        # ссылки «Старее» ведут на ?page=N&before=<ключ последнего поста>
+        url = reverse('posts:index')
+        urls = [url]
+        amount = settings.POSTS_AMOUNT
+        keys = Post.objects.order_by('-created', '-pk').values_list(
+            'created', 'pk'
+        )
+        for number in range(2, pages + 1):
+            last = keys[(number - 1) * amount - 1:(number - 1) * amount]
+            last = next(iter(last), None)
+            if last is None:
+                break
+            query = urlencode({'page': number, 'before': encode_cursor(*last)})
+            urls.append(f'{url}?{query}')
+        return urls
+
+    def group_urls(self, limit):
+        slugs = Group.objects.order_by('-posts_count').values_list(
+            'slug', flat=True
+        )[:limit]
+        return [
+            reverse('posts:group_list', kwargs={'slug': slug})
+            for slug in slugs
+        ]
+
+    def profile_urls(self, limit):
+        usernames = AuthorStats.objects.order_by(
+            '-followers_count'
+        ).values_list('user__username', flat=True)[:limit]
+        return [
+            reverse('posts:profile', kwargs={'username': username})
+            for username in usernames
+        ]
+
+    def fetch(self, url, host, secure):
+        client = Client(HTTP_HOST=host)
+        started = time.monotonic()
+        try:
+            response = client.get(url, secure=secure)
+        finally:
+            # соединения с базой у каждого потока свои
+            connections.close_all()
+        return url, response.status_code, time.monotonic() - started
+
+    def handle(self, *args, **options):
+        urls = (
+            self.index_urls(options['pages'])
+            + self.group_urls(options['groups'])
+            + self.profile_urls(options['profiles'])
+        )
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = pool.map(
+                lambda url: self.fetch(
+                    url, options['host'], options['secure']
+                ),
+                urls
+            )
+            for url, status, elapsed in results:
+                style = self.style.SUCCESS if status == 200 else (
+                    self.style.ERROR
+                )
+                self.stdout.write(
+                    style(f'{status} {elapsed * 1000:8.1f} мс  {url}')
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {len(urls)} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:08
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import migrations, models
+
+
+def describe_images(apps, schema_editor):
+    from posts.images import describe
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').filter(image_width__isnull=True)
+    for post in posts.iterator():
+        try:
+            with post.image.open() as image:
+                width, height, placeholder = describe(image)
+        except (OSError, SuspiciousFileOperation):
+            continue
+        Post.objects.filter(pk=post.pk).update(
+            image_width=width,
+            image_height=height,
+            image_placeholder=placeholder,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_auto_20261018_2152'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(describe_images, migrations.RunPython.noop),
+    ]
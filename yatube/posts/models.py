@@ -1,7 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import models, transaction
+from django.db.models import F
 
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
+
+from .images import describe
 
 User = get_user_model()
 
@@ -10,6 +15,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -32,14 +38,106 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        # одинаковые картинки хранятся одним файлом с общими миниатюрами
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # заполняются при загрузке картинки, чтобы ленты не читали файл
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # группа на момент загрузки нужна для пересчета счетчиков групп
+        post.loaded_group_id = post.__dict__.get('group_id')
+        post.loaded_image = post.__dict__.get('image')
+        return post
+
+    def describe_image(self):
+        """Запоминает размеры и заглушку новой картинки."""
+        self.image_width = self.image_height = None
+        self.image_placeholder = ''
+        if not self.image:
+            return
+        try:
+            self.image.open()
+            (self.image_width, self.image_height,
+             self.image_placeholder) = describe(self.image)
+        except (OSError, SuspiciousFileOperation):
+            # файла нет или это не картинка: поля остаются пустыми
+            pass
+
+    def store_image(self):
+        """
+        Записывает новую картинку и закрепляет файл до конца транзакции.
+        Файл с тем же содержимым мог как раз удалиться вместе с последним
+        постом, который на него ссылался: тогда он записывается заново.
+        """
+        upload_name = self.image.name
+        content = self.image.file
+        self.image.save(upload_name, content, save=False)
+        PostImage.lock(self.image.name)
+        if not self.image.storage.exists(self.image.name):
+            content.seek(0)
+            self.image.save(upload_name, content, save=False)
+
+    def save(self, *args, **kwargs):
+        if self.image.name != getattr(self, 'loaded_image', None):
+            self.describe_image()
+        # счетчики обновляются в post_save в той же транзакции
+        with transaction.atomic():
+            if self.image and not self.image._committed:
+                self.store_image()
+            super().save(*args, **kwargs)
+        # и для только что созданного поста: следующая смена группы
+        # пересчитывает счетчики и сбрасывает ленту прежней группы
+        self.loaded_group_id = self.group_id
+
     class Meta:
         ordering = ['-created']
+        # индексы повторяют порядок лент (created, id) по убыванию
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='post_created'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created'
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created'
+            ),
+            # по нему считаются ссылки на общий файл картинки
+            models.Index(fields=['image'], name='post_image'),
+        ]
+
+
+class PostImage(models.Model):
+    """
+    Файл картинки, общий для постов с одинаковым содержимым. Строка
+    служит блокировкой: новая ссылка на файл и его удаление после
+    последнего поста выполняются по очереди.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+
+    @classmethod
+    def lock(cls, name):
+        """Блокирует файл до конца текущей транзакции."""
+        # UPDATE блокирует и в SQLite, где select_for_update не работает;
+        # строку может удалить освобождение файла, тогда она создается
+        while not cls.objects.filter(name=name).update(name=F('name')):
+            cls.objects.get_or_create(name=name)
 
 
 class Comment(CreatedModel):
@@ -55,6 +153,14 @@ class Comment(CreatedModel):
     )
     text = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -68,7 +174,14 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
+        indexes = [
+            models.Index(fields=['author', 'user'], name='follow_author_user'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
@@ -79,3 +192,59 @@ class Follow(models.Model):
                 check=~models.Q(user=models.F("author"))
             ),
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # копия Post.created, чтобы лента читалась одним диапазоном индекса
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created'
+            ),
+        ]
+
+
+class PulledAuthor(models.Model):
+    """
+    Автор с большим числом подписчиков: его посты не раскладываются
+    по лентам при записи, а подмешиваются в ленту при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pulled_feed'
+    )
+
+
+class AuthorStats(models.Model):
+    """Счетчики постов и подписок пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,175 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(created, pk):
+    """Кодирует ключ (created, pk) в непрозрачный курсор для URL."""
+    raw = f'{created.isoformat()}_{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; для испорченного курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created, pk = raw.rsplit('_', 1)
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created is None:
+        return None
+    return created, pk
+
+
+def beyond(queryset, key, cursor, newer):
+    """Строки queryset строго новее (или старше) курсора по key."""
+    created, pk = cursor
+    created_field, pk_field = key
+    lookup = 'gt' if newer else 'lt'
+    return queryset.filter(
+        Q(**{f'{created_field}__{lookup}': created})
+        | Q(**{created_field: created, f'{pk_field}__{lookup}': pk})
+    )
+
+
+def keyset(queryset, key, cursor, newer, limit):
+    """
+    Строки упорядоченного по убыванию key queryset, строго старше
+    (или новее) курсора. Результат всегда идет от новых к старым.
+    """
+    rows = beyond(queryset, key, cursor, newer)
+    if newer:
+        return list(rows.reverse()[:limit])[::-1]
+    return list(rows[:limit])
+
+
+class CursorPaginator(Paginator):
+    """
+    Паджинатор по ключу (created, pk) без COUNT(*) и глубоких OFFSET.
+
+    Страницы «новее»/«старее» выбираются по курсору, ?page=N работает
+    для совместимости: первые PAGINATOR_OFFSET_PAGES страниц читаются
+    через OFFSET, более глубокие — от якоря, сохраненного в кэше при
+    показе предыдущей страницы по номеру, либо от ключа, найденного
+    по индексу.
+    Число страниц известно только до следующей, поэтому num_pages
+    не требует подсчета строк, а count можно передать готовым.
+    """
+    key = ('created', 'pk')
+
+    def __init__(self, object_list, per_page, name=None, count=None,
+                 **kwargs):
+        ordering = [f'-{field}' for field in self.key]
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        if count is not None:
+            self.count = count
+        self.name = name
+        self.number = 1
+        self.has_older = False
+        self.older_cursor = None
+        self.newer_cursor = None
+
+    @property
+    def num_pages(self):
+        return self.number + int(self.has_older)
+
+    def row_key(self, row):
+        return tuple(getattr(row, field) for field in self.key)
+
+    def page_items(self, rows):
+        """Превращает строки выборки в объекты страницы."""
+        return rows
+
+    def seek(self, cursor, newer, limit):
+        return keyset(self.object_list, self.key, cursor, newer, limit)
+
+    def slice(self, offset, limit):
+        return list(self.object_list[offset:offset + limit])
+
+    def boundary(self, offset):
+        """Ключ строки, стоящей перед offset, читается только по индексу."""
+        keys = self.object_list.values_list(*self.key)[offset - 1:offset]
+        return next(iter(keys), None)
+
+    def _anchor_key(self, number):
+        return f'paginator:{self.name}:{number}'
+
+    def _save_anchor(self, number, cursor):
+        # запись только при изменении: чтение дешевле записи в общий кэш
+        key = self._anchor_key(number)
+        if cache.get(key) != cursor:
+            cache.set(key, cursor, settings.PAGINATOR_ANCHOR_TIMEOUT)
+
+    def _deep_rows(self, number):
+        offset = (number - 1) * self.per_page
+        cursor = None
+        if self.name is not None:
+            cursor = decode_cursor(cache.get(self._anchor_key(number)))
+        if cursor is None:
+            cursor = self.boundary(offset)
+        if cursor is None:
+            return []
+        return self.seek(cursor, newer=False, limit=self.per_page + 1)
+
+    def get_page(self, number=None, before=None, after=None):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        limit = self.per_page + 1
+        cursor = decode_cursor(before or after)
+        newer = cursor is not None and not before
+
+        if cursor is not None:
+            rows = self.seek(cursor, newer=newer, limit=limit)
+        elif number <= settings.PAGINATOR_OFFSET_PAGES:
+            rows = self.slice((number - 1) * self.per_page, limit)
+        else:
+            rows = self._deep_rows(number)
+
+        if newer:
+            has_newer = len(rows) > self.per_page
+            rows = rows[-self.per_page:]
+            self.has_older = True
+            if not has_newer:
+                number = 1
+        else:
+            has_newer = number > 1
+            self.has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        if not rows:
+            number = 1
+            has_newer = self.has_older = False
+        self.number = max(number, 1 + int(has_newer))
+
+        if rows:
+            self.newer_cursor = encode_cursor(*self.row_key(rows[0]))
+            self.older_cursor = encode_cursor(*self.row_key(rows[-1]))
+            # номер страницы при переходе по курсору берется из запроса
+            # как есть, поэтому якорь пишет только страница по номеру
+            if self.name is not None and self.has_older and cursor is None:
+                self._save_anchor(self.number + 1, self.older_cursor)
+        return self._get_page(self.page_items(rows), self.number, self)
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Паджинатор, который считает строки не дальше ADMIN_COUNT_LIMIT:
+    COUNT(*) по подзапросу с LIMIT не проходит всю таблицу. Если строк
+    больше, доступны страницы только в пределах лимита.
+    """
+
+    @cached_property
+    def count(self):
+        limited = self.object_list.order_by()[:settings.ADMIN_COUNT_LIMIT]
+        return limited.count()
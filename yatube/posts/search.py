@@ -0,0 +1,148 @@
+"""
+Полнотекстовый поиск постов и комментариев.
+
+На SQLite текст лежит в виртуальных таблицах FTS5 из миграций с rowid,
+равным id записи: сигналы обновляют их в той же транзакции, что и саму
+запись, а rebuild_search_index перестраивает по частям. Таблица
+соединяется с основной, поэтому остальные условия — обычные фильтры
+queryset. На других базах поиск сводится к icontains по каждому слову.
+"""
+import re
+from functools import reduce
+from operator import and_
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+
+# слова запроса; операторы FTS5 из ввода пользователя не доходят до MATCH
+WORD_RE = re.compile(r'\w+')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """
+    Выражение MATCH из строки пользователя: все слова должны найтись,
+    каждое как префикс, чтобы «пост» находил и «постов».
+    """
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+class RawSubquery(RawSQL):
+    """
+    Подзапрос для __in без собственных скобок: In добавляет их сам,
+    а x IN ((SELECT ...)) SQLite сравнивает только с первой строкой.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class FullTextIndex:
+    """Таблица FTS5 с текстом записей модели."""
+
+    def __init__(self, model, table):
+        self.model = model
+        self.table = table
+        self.source = model._meta.db_table
+
+    def _execute(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def index(self, instance):
+        if not enabled():
+            return
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid = %s', [instance.pk]
+        )
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+            [instance.pk, instance.text]
+        )
+
+    def unindex(self, pk):
+        if enabled():
+            self._execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+    def unindex_from(self, first_id):
+        """Убирает из индекса записи с id от first_id и выше."""
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid >= %s', [first_id]
+        )
+
+    def reindex_range(self, first_id, last_id):
+        """Переиндексирует записи с id в [first_id, last_id]."""
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid BETWEEN %s AND %s',
+            [first_id, last_id]
+        )
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text) '
+            f'SELECT id, text FROM {self.source} '
+            'WHERE id BETWEEN %s AND %s',
+            [first_id, last_id]
+        )
+
+    def optimize(self):
+        self._execute(
+            f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')",
+            []
+        )
+
+    def matches(self, query):
+        """
+        Условие «есть все слова запроса» для filter; None, если слов
+        в запросе нет.
+        """
+        words = WORD_RE.findall(query or '')
+        if not words:
+            return None
+        if not enabled():
+            return reduce(and_, (Q(text__icontains=word) for word in words))
+        return Q(pk__in=RawSubquery(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match_query(query)]
+        ))
+
+    def filter(self, queryset, query):
+        """
+        Записи со всеми словами запроса, без ранжирования: порядок
+        остается за queryset. Пустой запрос ничего не находит.
+        """
+        condition = self.matches(query)
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
+
+    def search(self, query, queryset=None):
+        """Записи со всеми словами запроса, от наиболее подходящих."""
+        if queryset is None:
+            queryset = self.model.objects.all()
+        if not enabled() or not WORD_RE.search(query or ''):
+            return self.filter(queryset, query).order_by('-created', '-pk')
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {self.source}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[match_query(query)],
+            select={'rank': f'{self.table}.rank'},
+        ).order_by('rank', '-created', '-pk')
+
+
+posts = FullTextIndex(Post, 'posts_post_fts')
+comments = FullTextIndex(Comment, 'posts_comment_fts')
+
+INDEXES = (posts, comments)
+
+
+def search(query, queryset=None):
+    """Посты по тексту, от наиболее подходящих."""
+    return posts.search(query, queryset)
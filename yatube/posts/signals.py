@@ -0,0 +1,173 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.cache import bump_versions_on_commit, delete_on_commit
+
+from . import counters, feeds, search, thumbnails
+from .cache import (GROUPS_VERSION, INDEX_VERSION, USERS_VERSION,
+                    comments_version, feed_version, follows_version,
+                    group_posts_version, group_version, post_list_versions,
+                    user_version)
+from .lookups import group_slug_key, username_key
+from .models import Comment, Follow, Group, Post, User
+
+
+def search_index(model):
+    return search.posts if model is Post else search.comments
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_created(instance)
+        feeds.fan_out(instance)
+    else:
+        counters.post_changed(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = str(getattr(instance, 'loaded_image', None) or '')
+    if created or instance.image.name != loaded:
+        thumbnails.schedule(instance)
+        # прежний файл мог остаться только у этого поста
+        thumbnails.schedule_release(loaded)
+    instance.loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+    thumbnails.schedule_release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def search_indexed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search_index(sender).index(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def search_unindexed(sender, instance, **kwargs):
+    search_index(sender).unindex(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_created(instance)
+        feeds.follow(instance.user_id, instance.author_id)
+        bump_versions_on_commit(feed_version(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_deleted(instance)
+    feeds.unfollow(instance.user_id, instance.author_id)
+    bump_versions_on_commit(feed_version(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.user_created(instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    counters.user_deleting(instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # пост, перенесенный в другую группу, пропадает из ленты прежней
+    old_group_id = getattr(instance, 'loaded_group_id', None)
+    if old_group_id is not None and old_group_id != instance.group_id:
+        bump_versions_on_commit(group_posts_version(old_group_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(*post_list_versions(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(comments_version(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follows_changed(sender, instance, **kwargs):
+    # счетчики подписок показываются в профилях обоих пользователей
+    bump_versions_on_commit(
+        follows_version(instance.user_id), follows_version(instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(
+        INDEX_VERSION, GROUPS_VERSION, group_version(instance.pk)
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # вход пользователя обновляет только last_login, на ленту это не влияет
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_versions_on_commit(
+        INDEX_VERSION, USERS_VERSION, user_version(instance.pk)
+    )
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    instance.saved_slug = None
+    if not raw and instance.pk is not None:
+        instance.saved_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_lookup_changed(sender, instance, **kwargs):
+    # новый slug мог быть закэширован как неизвестный, а старый —
+    # запомнен параллельным запросом до фиксации
+    slugs = {instance.slug, getattr(instance, 'saved_slug', None)}
+    delete_on_commit([group_slug_key(slug) for slug in slugs if slug])
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance.saved_username = None
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    if not raw and instance.pk is not None:
+        instance.saved_username = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_lookup_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    usernames = {instance.username, getattr(instance, 'saved_username', None)}
+    delete_on_commit([username_key(name) for name in usernames if name])
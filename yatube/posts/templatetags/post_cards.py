@@ -0,0 +1,15 @@
+from django import template
+
+from posts.cache import CARD_TEMPLATE, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, template_name=CARD_TEMPLATE):
+    return render_cards(posts, template_name)
+
+
+@register.simple_tag
+def post_card(post, template_name=CARD_TEMPLATE):
+    return render_cards([post], template_name)[0]
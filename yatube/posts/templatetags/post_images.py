@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(image, name):
+    """Варианты картинки для <picture> или None, пока они создаются."""
+    return thumbnails.picture(image, name)
@@ -1,10 +1,14 @@
 import shutil
 import tempfile
+from contextlib import contextmanager
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from posts.models import Comment, Follow, Group, Post
 
@@ -12,8 +16,22 @@ User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+# общий уровень кэша в памяти: тесты не трогают кэш на диске,
+# с которым работает запущенный сервер разработки
+TEST_CACHES = {
+    'default': {**settings.CACHES['default'], 'LOCATION': 'tests'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    },
+}
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+
+# фоновый поток миниатюр мог бы писать во временный MEDIA_ROOT,
+# который тест уже удаляет
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, CACHES=TEST_CACHES
+)
 class TestCasePresets(TestCase):
     """
     Заранее подготовленные тестовые объекты
@@ -73,6 +91,9 @@ class TestCasePresets(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Откат транзакции теста не сдвигает версии кэша, поэтому
+        # закэшированные страницы прошлого теста сбрасываются явно
+        cache.clear()
         # Создаем неавторизованный клиент
         self.guest_client = Client()
         # Создаем авторизованный клиент
@@ -88,3 +109,14 @@ class TestCasePresets(TestCase):
             user=self.user,
             author=self.author,
         )
+
+    @contextmanager
+    def assertMaxQueries(self, budget, msg=None):
+        """Падает, если в блоке выполнено больше budget запросов к базе"""
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        executed = '\n'.join(query['sql'] for query in queries)
+        self.assertLessEqual(
+            len(queries), budget,
+            msg or f'Превышен бюджет запросов:\n{executed}'
+        )
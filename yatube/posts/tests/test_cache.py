@@ -1,15 +1,35 @@
+import pickle
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import Http404, HttpRequest
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import urlencode
+
+from core.cache import get_versions
+from posts.cache import GROUPS_VERSION, follow_feed_state, render_cards
+from posts.lookups import get_group_or_404, get_user_or_404, username_key
+from posts.models import Comment, Follow, Group, Post
+from posts.signals import post_changed
 
-from posts.models import Post
+from .presets import TEST_CACHES, TestCasePresets
 
-from .presets import TestCasePresets
+User = get_user_model()
 
 
 class IndexCacheTests(TestCasePresets):
 
     def setUp(self):
         super().setUp()
+        cache.clear()
         self.post_delete = Post.objects.create(
             text='Какой-то текст',
             author=self.author,
@@ -17,34 +37,523 @@ class IndexCacheTests(TestCasePresets):
         )
 
     def test_index_page_cache(self):
-        """Пост не пропадает со страницы, если не очистить кэш"""
+        """Повторный показ главной берется из кэша без запросов к базе"""
 
-        response = self.author_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index'))
 
-        self.post_delete.delete()
-        response_deleted = self.author_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response_cached = self.guest_client.get(reverse('posts:index'))
 
         self.assertEqual(
             response.content,
-            response_deleted.content,
-            'При удалении пост пропал со страницы до очистки кэша'
+            response_cached.content,
+            'Главная страница не берется из кэша'
         )
 
-    def test_index_clear_cache(self):
-        """Пост пропадает со страницы только после очистки кэша"""
+    def test_index_cache_invalidated_on_delete(self):
+        """Удаленный пост сразу пропадает с закэшированной главной"""
 
-        self.author_client.get(reverse('posts:index'))
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post_delete.text)
 
         self.post_delete.delete()
         response_deleted = self.author_client.get(reverse('posts:index'))
 
+        self.assertNotContains(
+            response_deleted,
+            self.post_delete.text,
+            msg_prefix='При удалении пост не пропал со страницы'
+        )
+
+    def test_index_cache_invalidated_on_create(self):
+        """Новый пост сразу появляется на закэшированной главной"""
+
+        self.author_client.get(reverse('posts:index'))
+        Post.objects.create(text='Свежий пост', author=self.author)
+        response = self.author_client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'Свежий пост')
+
+    def test_index_cache_kept_on_login(self):
+        """Вход пользователя не сбрасывает кэш главной"""
+
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.force_login(self.guest)
+        self.guest_client.logout()
+
+        with self.assertNumQueries(0):
+            self.guest_client.get(reverse('posts:index'))
+
+
+class PostCardCacheTests(TestCasePresets):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_card_rendered_once(self):
+        """Карточка поста отрисовывается один раз для всех лент"""
+
+        render_cards([self.post])
+        with mock.patch('posts.cache.render_to_string') as render:
+            for url in (
+                reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+                reverse('posts:profile', kwargs={'username': self.author}),
+                reverse('posts:follow_index'),
+            ):
+                with self.subTest(url=url):
+                    self.user_client.get(url)
+        render.assert_not_called()
+
+    def test_card_invalidated_on_post_edit(self):
+        """Изменение поста меняет его карточку"""
+
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        self.post.text = 'Новый текст поста'
+        self.post.save()
+
+        self.assertContains(self.guest_client.get(url), 'Новый текст поста')
+
+    def test_card_invalidated_on_author_change(self):
+        """Изменение автора меняет карточки его постов"""
+
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Александр'
+        author.save()
+
+        self.assertContains(self.guest_client.get(url), 'Александр')
+
+    def test_card_invalidated_on_group_change(self):
+        """Изменение группы меняет карточки ее постов"""
+
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.guest_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+
+        self.assertContains(self.guest_client.get(url), '/group/new-slug/')
+
+
+class FollowFeedCacheTests(TestCasePresets):
+    """
+    Кэш ленты подписок.
+    В presets.py SetUp() создана подписка User на Author
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.guest_client.force_login(self.guest)
+        self.post_other = Post.objects.create(
+            text='Пост пользователя без подписчиков', author=self.guest
+        )
+
+    def test_follow_feed_is_per_user(self):
+        """Лента подписок одного пользователя не показывается другому"""
+
+        self.user_client.get(reverse('posts:follow_index'))
+        response = self.guest_client.get(reverse('posts:follow_index'))
+
+        self.assertNotContains(response, self.post.text[:20])
+
+    def test_follow_feed_not_shared_with_index(self):
+        """Лента подписок и главная кэшируются раздельно"""
+
+        self.user_client.get(reverse('posts:index'))
+        response = self.user_client.get(reverse('posts:follow_index'))
+
+        self.assertNotContains(response, self.post_other.text)
+
+    def test_follow_feed_invalidated_on_new_post(self):
+        """Новый пост отслеживаемого автора сразу появляется в ленте"""
+
+        self.user_client.get(reverse('posts:follow_index'))
+        Post.objects.create(text='Свежий пост автора', author=self.author)
+        response = self.user_client.get(reverse('posts:follow_index'))
+
+        self.assertContains(response, 'Свежий пост автора')
+
+    def test_follow_feed_invalidated_on_follow(self):
+        """Подписка и отписка сразу меняют ленту"""
+
+        self.user_client.get(reverse('posts:follow_index'))
+        self.user_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.guest}
+        ))
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, self.post_other.text)
+
+        self.user_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.guest}
+        ))
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, self.post_other.text)
+
+    def test_follow_feed_invalidated_on_delete(self):
+        """Удаленный пост сразу пропадает из ленты"""
+
+        self.user_client.get(reverse('posts:follow_index'))
+        Post.objects.get(pk=self.post.pk).delete()
+        response = self.user_client.get(reverse('posts:follow_index'))
+
+        self.assertNotContains(response, self.post.text[:20])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_follow_feed_invalidated_on_pulled_post(self):
+        """Новый пост pulled-автора сразу появляется в ленте"""
+
+        Follow.objects.create(user=self.guest, author=self.author)
+        self.user_client.get(reverse('posts:follow_index'))
+        Post.objects.create(text='Свежий пост звезды', author=self.author)
+        response = self.user_client.get(reverse('posts:follow_index'))
+
+        self.assertContains(response, 'Свежий пост звезды')
+
+    def test_follow_feed_version_bounded(self):
+        """
+        Версия ленты считается раз за запрос и не читает поколения
+        каждого отслеживаемого автора
+        """
+        for i in range(5):
+            author = User.objects.create_user(username=f'writer{i}')
+            Follow.objects.create(user=self.user, author=author)
+        request = HttpRequest()
+        request.user = self.user
+
+        with mock.patch(
+            'posts.cache.get_versions', wraps=get_versions
+        ) as versions:
+            follow_feed_state(request)
+            follow_feed_state(request)
+        versions.assert_called_once_with(GROUPS_VERSION)
+
+
+class PageCacheTests(TestCasePresets):
+    """Кэш целых страниц для анонимов и сброс по тегам"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='description'
+        )
+        self.group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}
+        )
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.author}
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторная страница для анонима отдается без запросов к базе"""
+        for url in (self.group_url, self.post_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    response_cached = self.guest_client.get(url)
+                self.assertEqual(response.content, response_cached.content)
+
+    def test_authenticated_page_not_cached(self):
+        """Страницы авторизованных пользователей не кэшируются целиком"""
+        self.user_client.get(self.group_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.user_client.get(self.group_url)
+
+        self.assertTrue(queries)
+
+    def test_new_post_purges_only_its_group(self):
+        """Новый пост сбрасывает страницу своей группы, но не чужой"""
+        other_url = reverse(
+            'posts:group_list', kwargs={'slug': self.other_group.slug}
+        )
+        self.guest_client.get(self.group_url)
+        self.guest_client.get(other_url)
+        Post.objects.create(
+            text='Пост в группе', author=self.author, group=self.group
+        )
+
+        self.assertContains(self.guest_client.get(self.group_url),
+                            'Пост в группе')
+        with self.assertNumQueries(0):
+            self.guest_client.get(other_url)
+
+    def test_moved_post_purges_old_group(self):
+        """Пост, перенесенный в другую группу, пропадает из прежней"""
+        self.guest_client.get(self.group_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+
+        response = self.guest_client.get(self.group_url)
+        self.assertNotIn(post, response.context['page_obj'])
+
+    def test_comment_purges_post_page(self):
+        """Новый комментарий сразу появляется на странице поста"""
+        self.guest_client.get(self.post_url)
+        Comment.objects.create(
+            text='Свежий комментарий', author=self.user, post=self.post
+        )
+
+        self.assertContains(self.guest_client.get(self.post_url),
+                            'Свежий комментарий')
+
+    def test_follow_purges_profile(self):
+        """Подписка сразу меняет счетчик подписчиков в профиле"""
+        self.guest_client.get(self.profile_url)
+        Follow.objects.create(user=self.guest, author=self.author)
+
+        response = self.guest_client.get(self.profile_url)
+        self.assertEqual(response.context['stats'].followers_count, 2)
+
+    def test_stale_fragment_not_cached(self):
+        """Страница с устаревшим фрагментом не кэшируется и без ETag"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.author)
+        # фрагмент ленты сейчас пересчитывает другой запрос
+        lock = make_template_fragment_key(
+            'feed_page', ['index_page', '::']
+        ) + ':lock'
+        cache.add(lock, 1)
+
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertFalse(response.has_header('ETag'))
+
+        cache.delete(lock)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Свежий пост')
+        self.assertTrue(response.has_header('ETag'))
+
+
+class ConditionalGetTests(TestCasePresets):
+    """Условные GET-запросы по ETag"""
+
+    def setUp(self):
+        super().setUp()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+        )
+
+    def _revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        """Неизмененная страница отвечает 304 анонимам и авторизованным"""
+        for client in (self.guest_client, self.user_client):
+            for url in self.urls + (reverse('posts:follow_index'),):
+                if client is self.guest_client and 'follow' in url:
+                    continue
+                with self.subTest(url=url, client=client):
+                    response = self._revalidate(client, url)
+                    self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_without_rendering(self):
+        """304 отдается без отрисовки шаблонов"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.user_client.get(url)['ETag']
+        with mock.patch('django.template.backends.django.Template.render',
+                        side_effect=AssertionError) as render:
+            self.user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        render.assert_not_called()
+
+    def test_modified_after_change(self):
+        """После изменения данных страница отдается целиком"""
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(text='Новый', author=self.user, post=self.post)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Измененный текст'
+        post.save()
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_is_per_user(self):
+        """ETag одного пользователя не подходит другому"""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        etag = self.user_client.get(url)['ETag']
+
+        for client in (self.author_client, self.guest_client):
+            with self.subTest(client=client):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class WarmCacheTests(TransactionTestCase):
+    """Прогрев кэша после выкладки"""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='title', slug='slug')
+        for i in range(15):
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+
+    def test_warm_cache(self):
+        """Прогретые страницы отдаются анонимам без запросов к базе"""
+        out = StringIO()
+        call_command('warm_cache', pages=3, workers=2, stdout=out)
+
+        self.assertIn('Прогрето страниц: 4', out.getvalue())
+        index = self.client.get(reverse('posts:index'))
+        urls = [
+            reverse('posts:index') + '?' + urlencode({
+                'page': 2,
+                'before': index.context['page_obj'].paginator.older_cursor,
+            }),
+            reverse('posts:group_list', kwargs={'slug': 'slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(client.get(url).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CommitInvalidationTests(TransactionTestCase):
+    """Отрисованное до фиксации записи не читается после нее"""
+
+    def setUp(self):
         cache.clear()
-        response_deleted_cache_cleared = self.author_client.get(
-            reverse('posts:index')
+        self.author = User.objects.create_user(username='author')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def _render_during_write(self, client):
+        url = reverse('posts:index')
+        client.get(url)
+        post = Post(pk=1000, text='Новый пост', author=self.author)
+        with transaction.atomic():
+            # сигнал уже сдвинул версии, а другой запрос видит старые данные
+            post_changed(sender=Post, instance=post)
+            client.get(url)
+            Post.objects.bulk_create([post])
+        return client.get(url)
+
+    def test_fragment_rendered_before_commit(self):
+        """Фрагмент ленты, отрисованный до фиксации, пересчитывается"""
+        response = self._render_during_write(self.author_client)
+        self.assertContains(response, 'Новый пост')
+
+    def test_page_rendered_before_commit(self):
+        """Страница анонима, сохраненная до фиксации, не отдается"""
+        response = self._render_during_write(self.client)
+        self.assertContains(response, 'Новый пост')
+
+    def test_lookup_cached_before_commit(self):
+        """Имя, запомненное до фиксации переименования, не находится"""
+        get_user_or_404('author')
+        with transaction.atomic():
+            self.author.username = 'renamed'
+            self.author.save()
+            # параллельный запрос еще видит прежнее имя
+            cache.set(username_key('author'), self.author.pk)
+
+        with self.assertRaises(Http404):
+            get_user_or_404('author')
+
+
+class LookupCacheTests(TestCasePresets):
+    """Кэш поиска групп по slug и пользователей по username"""
+
+    def test_lookup_cached(self):
+        """Повторный поиск группы и автора не обращается к базе"""
+        get_group_or_404(self.group.slug)
+        get_user_or_404(self.author.username)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group_or_404(self.group.slug), self.group)
+            self.assertEqual(
+                get_user_or_404(self.author.username), self.author
+            )
+
+    def test_password_not_cached(self):
+        """Пароль пользователя не попадает в кэш"""
+        with mock.patch.object(cache, 'set') as cache_set:
+            get_user_or_404(self.author.username)
+
+        for call in cache_set.call_args_list:
+            self.assertNotIn(
+                self.author.password.encode(), pickle.dumps(call.args)
+            )
+        self.assertEqual(
+            get_user_or_404(self.author.username).get_full_name(),
+            self.author.get_full_name()
         )
 
-        self.assertNotEqual(
-            response_deleted.content,
-            response_deleted_cache_cleared.content,
-            'При удалении пост не пропал со страницы после очистки кэша'
+    def test_unknown_name_cached(self):
+        """Неизвестные имена запоминаются и не проверяются в базе снова"""
+        for lookup in (get_group_or_404, get_user_or_404):
+            with self.subTest(lookup=lookup):
+                with self.assertRaises(Http404):
+                    lookup('unknown')
+                with self.assertNumQueries(0), self.assertRaises(Http404):
+                    lookup('unknown')
+
+    def test_created_name_found(self):
+        """Созданная группа находится, даже если ее slug искали раньше"""
+        with self.assertRaises(Http404):
+            get_group_or_404('new-slug')
+        group = Group.objects.create(title='Новая', slug='new-slug')
+
+        self.assertEqual(get_group_or_404('new-slug'), group)
+
+    def test_renamed_group(self):
+        """После смены slug старый адрес не находится, а новый находится"""
+        get_group_or_404(self.group.slug)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.title = 'Новое название'
+        group.save()
+
+        with self.assertRaises(Http404):
+            get_group_or_404(self.group.slug)
+        self.assertEqual(
+            get_group_or_404('renamed').title, 'Новое название'
         )
+
+    def test_renamed_user(self):
+        """После смены username профиль открывается по новому имени"""
+        get_user_or_404(self.author.username)
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.save()
+
+        with self.assertRaises(Http404):
+            get_user_or_404(self.author.username)
+        self.assertEqual(get_user_or_404('renamed'), author)
+
+    def test_group_posts_count_updated(self):
+        """Закэшированная группа получает новое число постов"""
+        get_group_or_404(self.group.slug)
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+
+        self.assertEqual(
+            get_group_or_404(self.group.slug).posts_count,
+            Post.objects.filter(group=self.group).count()
+        )
+
+    def test_deleted_user(self):
+        """Удаленный пользователь сразу перестает находиться"""
+        get_user_or_404(self.guest.username)
+        User.objects.get(pk=self.guest.pk).delete()
+
+        with self.assertRaises(Http404):
+            get_user_or_404(self.guest.username)
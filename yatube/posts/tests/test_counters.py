@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorStats, Follow, Group, Post
+
+from .presets import TestCasePresets
+
+User = get_user_model()
+
+
+class CountersTests(TestCasePresets):
+    """
+    Денормализованные счетчики.
+    В presets.py SetUp() создана подписка User на Author
+    """
+
+    def _stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def _group_posts(self, group):
+        return Group.objects.get(pk=group.pk).posts_count
+
+    def test_post_counters(self):
+        """Создание и удаление поста меняет счетчики автора и группы"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.assertEqual(self._stats(self.author).posts_count, 2)
+        self.assertEqual(self._group_posts(self.group), 2)
+
+        post.delete()
+        self.assertEqual(self._stats(self.author).posts_count, 1)
+        self.assertEqual(self._group_posts(self.group), 1)
+
+    def test_post_group_change(self):
+        """Перенос поста в другую группу переносит и счетчик"""
+        group = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = group
+        post.save()
+        self.assertEqual(self._group_posts(self.group), 0)
+        self.assertEqual(self._group_posts(group), 1)
+
+    def test_new_post_group_change(self):
+        """Перенос только что созданного поста тоже переносит счетчик"""
+        group = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        post.group = group
+        post.save()
+        self.assertEqual(self._group_posts(self.group), 1)
+        self.assertEqual(self._group_posts(group), 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики подписчиков и подписок"""
+        self.assertEqual(self._stats(self.author).followers_count, 1)
+        self.assertEqual(self._stats(self.user).following_count, 1)
+
+        self.follow.delete()
+        self.assertEqual(self._stats(self.author).followers_count, 0)
+        self.assertEqual(self._stats(self.user).following_count, 0)
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters исправляет разошедшиеся счетчики"""
+        AuthorStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Group.objects.update(posts_count=7)
+        AuthorStats.objects.filter(user=self.guest).delete()
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.assertEqual(self._stats(self.author).posts_count, 1)
+        self.assertEqual(self._stats(self.author).followers_count, 1)
+        self.assertEqual(self._stats(self.user).following_count, 1)
+        self.assertEqual(self._stats(self.guest).posts_count, 0)
+        self.assertEqual(self._group_posts(self.group), 1)
+
+    def test_pages_without_count_query(self):
+        """Профиль и группа показывают счетчики без COUNT(*)"""
+        for url in (
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.guest_client.get(url)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_user_delete(self):
+        """Удаление пользователя с постами и подписками не ломает счетчики"""
+        Follow.objects.create(user=self.author, author=self.user)
+        Post.objects.create(text='Пост', author=self.user, group=self.group)
+        User.objects.get(pk=self.user.pk).delete()
+        # внешние ключи SQLite проверяет только в конце транзакции
+        connection.check_constraints()
+
+        self.assertFalse(AuthorStats.objects.filter(user=self.user).exists())
+        self.assertEqual(self._stats(self.author).followers_count, 0)
+        self.assertEqual(self._stats(self.author).following_count, 0)
+        self.assertEqual(self._group_posts(self.group), 1)
+
+    def test_user_delete_rolled_back(self):
+        """После отката удаления счетчики пользователя снова меняются"""
+        def fail(**kwargs):
+            raise DatabaseError('откат')
+
+        # удаление обрывается на середине каскада
+        post_delete.connect(fail, sender=Post)
+        try:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                User.objects.get(pk=self.author.pk).delete()
+        finally:
+            post_delete.disconnect(fail, sender=Post)
+
+        Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self._stats(self.author).posts_count, 2)
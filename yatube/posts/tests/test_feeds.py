@@ -0,0 +1,188 @@
+import re
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feeds
+from posts.models import Follow, Post, PulledAuthor, TimelineEntry
+
+from .presets import TestCasePresets
+
+User = get_user_model()
+
+
+class TimelineTests(TestCasePresets):
+    """
+    Материализованная лента подписок.
+    В presets.py SetUp() создана подписка User на Author
+    """
+
+    def _timeline(self, user):
+        return list(
+            TimelineEntry.objects.filter(user=user).order_by(
+                '-created', '-post_id'
+            ).values_list('post_id', flat=True)
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже написанные посты автора"""
+        self.assertEqual(self._timeline(self.user), [self.post.pk])
+
+    def test_new_post_fans_out(self):
+        """Новый пост автора попадает в ленту подписчика"""
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self._timeline(self.user), [post.pk, self.post.pk])
+        self.assertEqual(self._timeline(self.guest), [])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        self.user_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertEqual(self._timeline(self.user), [])
+
+    @override_settings(TIMELINE_MAX_ENTRIES=3)
+    def test_timeline_size_cap(self):
+        """Команда prune_timelines обрезает ленты до предела"""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(5)
+        ]
+        # запрос с постом ленты не обрезает
+        self.assertEqual(len(self._timeline(self.user)), 6)
+
+        call_command('prune_timelines', stdout=StringIO())
+        self.assertEqual(
+            self._timeline(self.user), [post.pk for post in posts[:1:-1]]
+        )
+
+    def test_prune_in_one_query(self):
+        """Ленты всех подписчиков обрезаются одним запросом"""
+        Follow.objects.create(user=self.guest, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        followers = Follow.objects.filter(author=self.author).values(
+            'user_id'
+        )
+        with override_settings(TIMELINE_MAX_ENTRIES=2):
+            with self.assertNumQueries(1):
+                feeds.prune(followers)
+
+        for user in (self.user, self.guest):
+            with self.subTest(user=user):
+                self.assertEqual(
+                    self._timeline(user), [posts[2].pk, posts[1].pk]
+                )
+
+    def test_follow_index_reads_timeline(self):
+        """Лента подписок строится из материализованной ленты"""
+        TimelineEntry.objects.filter(user=self.user).delete()
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines собирает ленты с нуля"""
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.create(
+            user=self.guest, post=self.post, created=self.post.created
+        )
+        Follow.objects.create(user=self.guest, author=self.user)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self._timeline(self.user), [self.post.pk])
+        self.assertEqual(self._timeline(self.guest), [])
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class HybridFeedTests(TestCasePresets):
+    """Посты авторов с большим числом подписчиков подмешиваются при чтении"""
+
+    def setUp(self):
+        super().setUp()
+        # второй подписчик переводит автора в pulled
+        Follow.objects.create(user=self.guest, author=self.author)
+        self.writer = User.objects.create_user(username='writer')
+        Follow.objects.create(user=self.user, author=self.writer)
+
+    def test_author_becomes_pulled(self):
+        """Автор, перешагнувший порог подписчиков, становится pulled"""
+        self.assertTrue(
+            PulledAuthor.objects.filter(author=self.author).exists()
+        )
+        self.assertFalse(
+            PulledAuthor.objects.filter(author=self.writer).exists()
+        )
+
+    def test_pulled_post_not_fanned_out(self):
+        """Пост pulled-автора не раскладывается по лентам"""
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_follow_index_merges_pulled_posts(self):
+        """Лента сливает материализованные и pulled-посты по времени"""
+        posts = []
+        for i in range(12):
+            author = self.author if i % 2 else self.writer
+            posts.append(Post.objects.create(text=f'Пост {i}', author=author))
+        expected = posts[::-1] + [self.post]
+
+        url = reverse('posts:follow_index')
+        first = self.user_client.get(url).context['page_obj']
+        second = self.user_client.get(url, {
+            'page': 2, 'before': first.paginator.older_cursor
+        }).context['page_obj']
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+
+    def test_pulled_posts_in_one_query(self):
+        """Посты всех pulled-авторов читаются одним запросом"""
+        Follow.objects.create(user=self.guest, author=self.writer)
+        for author in (self.author, self.writer):
+            Post.objects.create(text='Пост звезды', author=author)
+
+        url = reverse('posts:follow_index')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.user_client.get(url)
+        self.assertContains(response, 'Пост звезды', count=2)
+        pulled = [
+            query for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "posts_post"' in query['sql']
+        ]
+        self.assertEqual(len(pulled), 1)
+
+    @override_settings(POSTS_AMOUNT=3, PAGINATOR_OFFSET_PAGES=2)
+    def test_follow_index_pages_by_number(self):
+        """
+        Страницы по номеру собираются из слияния, а посты до страницы
+        читаются только ключами
+        """
+        posts = []
+        for i in range(12):
+            author = self.author if i % 2 else self.writer
+            posts.append(Post.objects.create(text=f'Пост {i}', author=author))
+        expected = posts[::-1] + [self.post]
+
+        url = reverse('posts:follow_index')
+        for number in range(1, 6):
+            # без якоря из кэша глубокая страница ищет ключ по индексу
+            cache.clear()
+            with self.subTest(page=number):
+                with CaptureQueriesContext(connection) as queries:
+                    page = self.user_client.get(
+                        url, {'page': number}
+                    ).context['page_obj']
+                start = (number - 1) * 3
+                self.assertEqual(list(page), expected[start:start + 3])
+                for query in queries:
+                    if '"posts_post"."text"' not in query['sql']:
+                        continue
+                    limit = re.search(r'LIMIT (\d+)', query['sql'])
+                    self.assertLessEqual(int(limit.group(1)), 4)
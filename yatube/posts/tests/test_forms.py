@@ -1,6 +1,10 @@
+from io import BytesIO
+
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Comment, Post
@@ -79,6 +83,84 @@ class PostCreateFormTests(TestCasePresets):
         )
 
 
+def make_upload(fmt='JPEG', size=(40, 20), exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif} if exif else {}
+    Image.new('RGB', size, 'red').save(buffer, fmt, **options)
+    return SimpleUploadedFile(
+        f'image.{fmt.lower()}', buffer.getvalue(), Image.MIME[fmt]
+    )
+
+
+class ImageUploadTests(TestCasePresets):
+    """Загрузка картинки ограничена и очищена от метаданных"""
+
+    def _post(self, upload):
+        return self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': upload}
+        )
+
+    @override_settings(UPLOAD_MAX_BYTES=100)
+    def test_file_size_limited(self):
+        """Слишком большой файл отклоняется с понятной ошибкой"""
+        response = self._post(make_upload())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'image',
+            'Файл весит 0.0 МБ, можно не больше 0.0 МБ'
+        )
+        self.assertFalse(Post.objects.filter(text='Пост с картинкой'))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixels_limited(self):
+        """Картинка с большим числом пикселей отклоняется"""
+        response = self._post(make_upload())
+
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей'
+        )
+
+    def test_exif_applied_and_stripped(self):
+        """Поворот из EXIF применяется, метаданные удаляются"""
+        exif = Image.Exif()
+        # Orientation: повернуть на 90°
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        self._post(make_upload(exif=exif.tobytes()))
+
+        post = Post.objects.get(text='Пост с картинкой')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertFalse(image.getexif())
+        self.assertEqual((post.image_width, post.image_height), (20, 40))
+
+    def test_png_transparency_kept(self):
+        """Прозрачный цвет палитры PNG переживает перекодирование"""
+        buffer = BytesIO()
+        Image.new('P', (40, 20), 0).save(buffer, 'PNG', transparency=0)
+        self._post(SimpleUploadedFile(
+            'image.png', buffer.getvalue(), 'image/png'
+        ))
+
+        post = Post.objects.get(text='Пост с картинкой')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.mode, 'P')
+            self.assertEqual(image.info.get('transparency'), 0)
+
+    def test_gif_kept(self):
+        """GIF сохраняется без перекодирования"""
+        upload = make_upload('GIF')
+        content = upload.read()
+        upload.seek(0)
+        self._post(upload)
+
+        post = Post.objects.get(text='Пост с картинкой')
+        with post.image.open() as image:
+            self.assertEqual(image.read(), content)
+
+
 class CommentCreateFormTests(TestCasePresets):
 
     def test_create_comment(self):
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginator import CursorPaginator, decode_cursor, encode_cursor
+
+from .presets import TestCasePresets
+
+
+class CursorPaginatorTests(TestCasePresets):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # посты для паджинатора, часть с одинаковым временем создания
+        posts = Post.objects.bulk_create(
+            Post(text=f'Post {i}', author=cls.author, group=cls.group)
+            for i in range(25)
+        )
+        Post.objects.filter(pk__in=[post.pk for post in posts[:5]]).update(
+            created=cls.post.created
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.expected = list(Post.objects.order_by('-created', '-pk'))
+
+    def _walk(self, url):
+        """Проходит ленту по ссылкам «Старее» и собирает посты"""
+        seen = []
+        response = self.guest_client.get(url)
+        while True:
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            if not page_obj.has_next():
+                return seen
+            response = self.guest_client.get(url, {
+                'page': page_obj.next_page_number(),
+                'before': page_obj.paginator.older_cursor,
+            })
+
+    def test_cursor_round_trip(self):
+        """Курсор кодируется и разбирается без потерь"""
+        cursor = encode_cursor(self.post.created, self.post.pk)
+        self.assertEqual(
+            decode_cursor(cursor), (self.post.created, self.post.pk)
+        )
+        self.assertIsNone(decode_cursor('мусор'))
+
+    def test_walk_by_cursor(self):
+        """По курсорам лента проходится целиком без повторов и пропусков"""
+        self.assertEqual(self._walk(reverse('posts:index')), self.expected)
+
+    def test_newer_cursor(self):
+        """Ссылка «Новее» возвращает предыдущую страницу"""
+        url = reverse('posts:index')
+        first = self.guest_client.get(url).context['page_obj']
+        second = self.guest_client.get(url, {
+            'page': 2, 'before': first.paginator.older_cursor
+        }).context['page_obj']
+        back = self.guest_client.get(url, {
+            'page': 1, 'after': second.paginator.newer_cursor
+        }).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    @override_settings(PAGINATOR_OFFSET_PAGES=1)
+    def test_deep_page_number(self):
+        """Глубокая ?page=N отдает те же посты, что и OFFSET"""
+        amount = settings.POSTS_AMOUNT
+        for number in (2, 3):
+            with self.subTest(number=number):
+                response = self.guest_client.get(
+                    reverse('posts:index'), {'page': number}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    self.expected[(number - 1) * amount:number * amount]
+                )
+
+    @override_settings(PAGINATOR_OFFSET_PAGES=1)
+    def test_anchor_not_set_by_cursor(self):
+        """Номер страницы рядом с курсором не портит якоря глубоких страниц"""
+        amount = settings.POSTS_AMOUNT
+        newest = self.expected[0]
+        self.guest_client.get(reverse('posts:index'), {
+            'page': 2, 'before': encode_cursor(newest.created, newest.pk)
+        })
+
+        response = self.guest_client.get(reverse('posts:index'), {'page': 3})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            self.expected[2 * amount:3 * amount]
+        )
+
+    def test_no_count_query(self):
+        """Страница ленты строится без COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = paginator.get_page(2)
+            page_obj.has_next()
+            page_obj.has_previous()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
+
+    def test_anchor_written_once(self):
+        """Якорь следующей страницы пишется в кэш, только если изменился"""
+        paginator = CursorPaginator(Post.objects.all(), 10, name='test')
+        paginator.get_page(1)
+        anchor = cache.get('paginator:test:2')
+        self.assertEqual(anchor, paginator.older_cursor)
+
+        with mock.patch.object(cache, 'set') as cache_set:
+            CursorPaginator(Post.objects.all(), 10, name='test').get_page(1)
+        cache_set.assert_not_called()
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import app_name, urlpatterns
+
+from .presets import TestCasePresets
+
+User = get_user_model()
+
+# Наибольшее число запросов к базе для каждой страницы posts.urls
+# при пустом кэше, не зависящее от числа постов и комментариев.
+# group_list, profile и post_detail читают ключ объекта еще и для ETag
+QUERY_BUDGETS = {
+    'index': 3,
+    'group_list': 6,
+    'profile': 7,
+    'post_detail': 6,
+    'post_create': 3,
+    'post_edit': 5,
+    'add_comment': 3,
+    'comments': 4,
+    'search': 3,
+    'follow_index': 5,
+    'profile_follow': 4,
+    'profile_unfollow': 4,
+}
+
+
+class QueryBudgetTests(TestCasePresets):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # разные авторы, группы и комментаторы, чтобы N+1 был заметен
+        for i in range(12):
+            author = User.objects.create_user(username=f'writer{i}')
+            group = Group.objects.create(title=f'Группа {i}', slug=f'g{i}')
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Post.objects.create(
+                text=f'Пост автора {i}', author=cls.author, group=group
+            )
+            Comment.objects.create(text=f'Комментарий {i}', author=author,
+                                   post=cls.post)
+            Follow.objects.create(user=cls.guest, author=author)
+            Follow.objects.create(user=author, author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.guest_client.force_login(self.guest)
+        self.kwargs = {
+            'slug': self.group.slug,
+            'username': self.author.username,
+            'post_id': self.post.pk,
+        }
+
+    def test_every_view_has_budget(self):
+        """Для каждой страницы posts.urls объявлен бюджет запросов"""
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_views_within_budget(self):
+        """Страницы укладываются в объявленный бюджет запросов"""
+        for pattern in urlpatterns:
+            url = reverse(f'{app_name}:{pattern.name}', kwargs={
+                name: self.kwargs[name] for name in pattern.pattern.converters
+            })
+            for client in (self.author_client, self.guest_client):
+                with self.subTest(url=url, client=client):
+                    # первый запрос заполняет KV-хранилище sorl-thumbnail
+                    client.get(url)
+                    cache.clear()
+                    with self.assertMaxQueries(QUERY_BUDGETS[pattern.name]):
+                        client.get(url)
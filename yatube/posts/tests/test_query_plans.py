@@ -0,0 +1,98 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+
+from .presets import TestCasePresets
+
+# полный проход таблицы без индекса и сортировка во временном B-дереве
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+(?! USING (COVERING )?INDEX)\b')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+LIMITED = (' WHERE ', ' ORDER BY ', ' LIMIT ')
+
+
+@override_settings(PAGINATOR_OFFSET_PAGES=1)
+class QueryPlanTests(TestCasePresets):
+    """
+    EXPLAIN QUERY PLAN для запросов каждой страницы:
+    ни одного полного прохода по таблицам posts и сортировок в памяти.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(25):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+
+    def _plans(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.user_client.get(url, params)
+        plans = []
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or '"posts_' not in sql:
+                continue
+            if not any(word in sql for word in LIMITED):
+                # полный список по смыслу, например группы в форме поста
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        return response, plans
+
+    def _assert_indexed(self, url, params=None):
+        response, plans = self._plans(url, params)
+        for sql, plan in plans:
+            for step in plan:
+                with self.subTest(url=url, params=params, step=step):
+                    self.assertIsNone(
+                        FULL_SCAN.search(step), f'Полный проход: {sql}'
+                    )
+                    self.assertIsNone(
+                        TEMP_SORT.search(step), f'Сортировка в памяти: {sql}'
+                    )
+        return response
+
+    def test_feeds_use_indexes(self):
+        """Ленты читаются по индексам, в том числе по курсору и глубоко"""
+        feeds = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        )
+        for url in feeds:
+            response = self._assert_indexed(url)
+            page_obj = response.context['page_obj']
+            self._assert_indexed(url, {
+                'page': 2, 'before': page_obj.paginator.older_cursor
+            })
+            self._assert_indexed(url, {
+                'page': 1, 'after': page_obj.paginator.older_cursor
+            })
+            self._assert_indexed(url, {'page': 3})
+
+    def test_pages_use_indexes(self):
+        """Остальные страницы приложения читаются по индексам"""
+        for url in (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_create'),
+        ):
+            self._assert_indexed(url)
+
+    def test_comments_use_indexes(self):
+        """Комментарии читаются по индексу поста, в том числе по курсору"""
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        response = self._assert_indexed(url)
+        self._assert_indexed(url, {
+            'before': response.context['comments'].paginator.older_cursor
+        })
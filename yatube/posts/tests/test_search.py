@@ -0,0 +1,165 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Follow, Group, Post, User
+
+from .presets import TestCasePresets
+
+
+class SearchTests(TestCasePresets):
+    """Полнотекстовый поиск постов"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Другая группа'
+        )
+        self.once = Post.objects.create(
+            text='Сегодня видел котов во дворе', author=self.author,
+            group=self.group
+        )
+        self.twice = Post.objects.create(
+            text='Коты, коты и еще раз коты', author=self.user,
+            group=self.other_group
+        )
+        Post.objects.create(text='Про собак', author=self.author)
+
+    def _search(self, **params):
+        response = self.guest_client.get(reverse('posts:search'), params)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['page_obj'])
+
+    def test_ranked_by_relevance(self):
+        """Пост, где слово встречается чаще, идет первым"""
+        self.assertEqual(self._search(q='кот'), [self.twice, self.once])
+
+    def test_all_words_required(self):
+        """Находятся только посты со всеми словами запроса"""
+        self.assertEqual(self._search(q='кот двор'), [self.once])
+
+    def test_filters(self):
+        """Результаты фильтруются по группе и автору"""
+        self.assertEqual(
+            self._search(q='кот', group=self.group.slug), [self.once]
+        )
+        self.assertEqual(
+            self._search(q='кот', author=self.user.username), [self.twice]
+        )
+        self.assertEqual(self._search(q='кот', author='unknown'), [])
+
+    def test_query_budget(self):
+        """Карточки результатов не добавляют запросов на каждый пост"""
+        params = {'q': 'кот', 'group': self.group.slug, 'author': 'author'}
+        self.author_client.get(reverse('posts:search'), params)
+        # сессия, пользователь, группы формы, группа и автор фильтров,
+        # число результатов и сама страница
+        with self.assertMaxQueries(7):
+            self.author_client.get(reverse('posts:search'), params)
+
+    def test_query_syntax_ignored(self):
+        """Операторы FTS5 во вводе не ломают поиск"""
+        for query in ('"кот', 'кот AND (', 'NEAR(кот', '*', ''):
+            with self.subTest(query=query):
+                self._search(q=query)
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста сразу видны в поиске"""
+        self.once.text = 'Теперь про хомяков'
+        self.once.save()
+        self.assertEqual(self._search(q='хомяк'), [self.once])
+        self.assertEqual(self._search(q='двор'), [])
+
+        self.twice.delete()
+        self.assertEqual(self._search(q='кот'), [])
+
+    def test_rebuild(self):
+        """Команда восстанавливает индекс по частям"""
+        table = search.posts.table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, text) VALUES (0, %s)',
+                ['кот без поста']
+            )
+        self.assertEqual(self._search(q='кот'), [])
+
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self._search(q='кот'), [self.twice, self.once])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            self.assertEqual(cursor.fetchone()[0], Post.objects.count())
+
+
+class AdminSearchTests(TestCasePresets):
+    """Поиск в админке идет по индексам"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(self.admin)
+        self.found = Post.objects.create(
+            text='Коты во дворе', author=self.user
+        )
+        self.comment = Comment.objects.create(
+            text='Отличные котики', author=self.guest, post=self.post
+        )
+
+    def _results(self, model, query):
+        response = self.client.get(
+            reverse(f'admin:posts_{model}_changelist'), {'q': query}
+        )
+        self.assertEqual(response.status_code, 200)
+        return set(response.context['cl'].result_list)
+
+    def test_text_search(self):
+        """Текст постов и комментариев ищется по FTS5"""
+        self.assertEqual(self._results('post', 'кот'), {self.found})
+        self.assertEqual(self._results('comment', 'котик'), {self.comment})
+
+    def test_all_matches_found(self):
+        """Находятся все подходящие записи, а не только первая"""
+        second = Post.objects.create(text='Кот на крыше', author=self.user)
+        self.assertEqual(self._results('post', 'кот'), {self.found, second})
+
+    def test_username_prefix(self):
+        """Авторы и подписчики ищутся по началу имени"""
+        self.assertEqual(
+            self._results('post', 'us'),
+            set(Post.objects.filter(author=self.user))
+        )
+        self.assertEqual(
+            self._results('comment', 'gue'), {self.comment}
+        )
+        self.assertEqual(
+            self._results('follow', 'auth'), set(Follow.objects.all())
+        )
+        self.assertEqual(self._results('follow', 'nobody'), set())
+
+    @override_settings(ADMIN_COUNT_LIMIT=2)
+    def test_count_capped(self):
+        """Найденные строки считаются не дальше лимита"""
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Пост'}
+        )
+
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    @override_settings(ADMIN_COUNT_LIMIT=2)
+    def test_count_without_search(self):
+        """Список без поиска считается полностью"""
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+
+        self.assertEqual(
+            response.context['cl'].result_count, Post.objects.count()
+        )
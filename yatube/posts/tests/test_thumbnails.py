@@ -0,0 +1,295 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image, features
+
+from posts import thumbnails
+from posts.models import Post, PostImage
+
+from .presets import TEST_CACHES, TestCasePresets
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='image.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 10, 10)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, CACHES=TEST_CACHES
+)
+class ThumbnailTests(TransactionTestCase):
+    """Миниатюры создаются после сохранения поста, а не в запросе"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+
+    def _no_resize(self):
+        return mock.patch(
+            'sorl.thumbnail.default.engine.get_image',
+            side_effect=AssertionError('Картинка уменьшается в запросе')
+        )
+
+    def test_generated_on_save(self):
+        """После сохранения поста миниатюры уже готовы"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=make_image()
+        )
+
+        for name, width, fmt in thumbnails.variants():
+            with self.subTest(name=name, width=width, fmt=fmt):
+                thumbnail = thumbnails.lookup(post.image, name, width, fmt)
+                self.assertIsNotNone(thumbnail)
+                self.assertTrue(thumbnail.exists())
+                self.assertEqual(thumbnail.width, width)
+        with self._no_resize():
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, thumbnails.lookup(post.image, 'card').url
+        )
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, показывается заглушка"""
+        with mock.patch('posts.thumbnails._submit') as submit:
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=make_image()
+            )
+        with self._no_resize():
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio')
+
+        thumbnails._submit(*submit.call_args[0])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, thumbnails.lookup(post.image, 'card').url
+        )
+
+    def test_generate_command(self):
+        """Команда доделывает миниатюры, потерянные при перезапуске"""
+        with mock.patch('posts.thumbnails._submit'):
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=make_image()
+            )
+        ready = Post.objects.create(
+            text='Готовый', author=self.author, image=make_image(size=(60, 40))
+        )
+        self.assertTrue(thumbnails.missing(post.image.name))
+
+        with mock.patch(
+            'posts.thumbnails.generate', wraps=thumbnails.generate
+        ) as generate:
+            call_command('generate_thumbnails', stdout=StringIO())
+
+        generate.assert_called_once_with(post, post.image.name)
+        self.assertFalse(thumbnails.missing(post.image.name))
+        self.assertFalse(thumbnails.missing(ready.image.name))
+
+    def test_regenerated_on_image_change(self):
+        """Новая картинка поста тоже получает миниатюры"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        post = Post.objects.get(pk=post.pk)
+        post.image = make_image('other.png')
+        post.save()
+
+        self.assertIsNotNone(thumbnails.lookup(post.image, 'card'))
+
+    def test_responsive_picture(self):
+        """Карточка отдает srcset по всем ширинам и ленивую загрузку"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=make_image()
+        )
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'sizes="(max-width')
+        for width in settings.POST_THUMBNAILS['card']['widths']:
+            with self.subTest(width=width):
+                url = thumbnails.lookup(post.image, 'card', width).url
+                self.assertContains(response, f'{url} {width}w')
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    def test_webp_source(self):
+        """Браузерам с WebP предлагается WebP-вариант"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=make_image()
+        )
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(
+            response, thumbnails.lookup(post.image, 'card', fmt='WEBP').url
+        )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, CACHES=TEST_CACHES
+)
+class SharedImageTests(TransactionTestCase):
+    """Одинаковые картинки хранятся одним файлом с общими миниатюрами"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+
+    def _post(self, image):
+        return Post.objects.create(
+            text='Пост', author=self.author, image=image
+        )
+
+    def test_same_content_stored_once(self):
+        """Повторная загрузка не создает ни файла, ни миниатюр"""
+        first = self._post(make_image('first.PNG'))
+        with mock.patch(
+            'sorl.thumbnail.default.engine.get_image',
+            side_effect=AssertionError('Миниатюра создается повторно')
+        ):
+            second = self._post(make_image('second.png'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w{2}/\w{62}\.png$')
+        self.assertEqual(
+            thumbnails.lookup(first.image, 'card').url,
+            thumbnails.lookup(second.image, 'card').url
+        )
+
+    def test_removed_with_last_reference(self):
+        """Файл и миниатюры удаляются вместе с последним постом"""
+        first = self._post(make_image())
+        second = self._post(make_image())
+        thumbnail = thumbnails.lookup(first.image, 'card')
+
+        first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        self.assertTrue(thumbnail.exists())
+
+        second.delete()
+        self.assertFalse(second.image.storage.exists(second.image.name))
+        self.assertFalse(thumbnail.exists())
+
+    def test_uploaded_while_released(self):
+        """Файл, удаленный во время новой загрузки, записывается заново"""
+        first = self._post(make_image())
+        storage = first.image.storage
+        lock = PostImage.lock
+
+        def released_before_lock(name):
+            # прежний пост удален, и release успел удалить файл
+            storage.delete(name)
+            lock(name)
+
+        with mock.patch.object(
+            PostImage, 'lock', side_effect=released_before_lock
+        ):
+            second = self._post(make_image())
+
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertTrue(storage.exists(second.image.name))
+
+    def test_release_keeps_referenced_file(self):
+        """Освобождение под блокировкой видит новую ссылку на файл"""
+        post = self._post(make_image())
+        name = post.image.name
+
+        self.assertFalse(thumbnails.release(name))
+        self.assertTrue(post.image.storage.exists(name))
+        post.delete()
+        self.assertFalse(post.image.storage.exists(name))
+        self.assertFalse(PostImage.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Замененная картинка удаляется, если больше не используется"""
+        post = self._post(make_image())
+        old_name = post.image.name
+        post = Post.objects.get(pk=post.pk)
+        post.image = make_image(size=(600, 400))
+        post.save()
+
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+
+    def test_dedupe_command(self):
+        """Команда сливает копии, загруженные до хранилища по хэшу"""
+        content = make_image().read()
+        names = [
+            default_storage.save(f'posts/{name}', BytesIO(content))
+            for name in ('legacy.png', 'copy.png')
+        ]
+        posts = [self._post(name) for name in names]
+
+        call_command('dedupe_images', stdout=StringIO())
+
+        new_names = {
+            post.image.name for post in Post.objects.filter(
+                pk__in=[post.pk for post in posts]
+            )
+        }
+        self.assertEqual(len(new_names), 1)
+        self.assertTrue(default_storage.exists(new_names.pop()))
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTests(TestCasePresets):
+    """Размеры и заглушка картинки сохраняются в строке поста"""
+
+    def test_filled_on_upload(self):
+        """При загрузке картинки заполняются размеры и заглушка"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=make_image(size=(300, 200))
+        )
+        post.refresh_from_db()
+
+        self.assertEqual((post.image_width, post.image_height), (300, 200))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 1000)
+
+    def test_feed_does_not_open_files(self):
+        """Лента с картинками не читает файлы картинок"""
+        Post.objects.create(
+            text='Пост', author=self.author, image=make_image()
+        )
+        with mock.patch(
+            'django.core.files.storage.FileSystemStorage.open',
+            side_effect=AssertionError('Файл картинки читается в ленте')
+        ):
+            response = self.guest_client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'data:image/jpeg;base64,')
+
+    def test_cleared_with_image(self):
+        """Без картинки размеры и заглушка очищаются"""
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = None
+        post.save()
+
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
@@ -4,9 +4,9 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import Client
+from django.test import Client, override_settings
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
 
 from .presets import TestCasePresets
 
@@ -301,3 +301,60 @@ class FollowingsTests(TestCasePresets):
             response.context,
             'Не должно быть записей'
         )
+
+
+@override_settings(COMMENTS_AMOUNT=3)
+class CommentsPaginationTests(TestCasePresets):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(7):
+            Comment.objects.create(
+                text=f'Комментарий {i}', author=cls.user, post=cls.post
+            )
+        cls.expected = list(
+            Comment.objects.filter(post=cls.post).order_by('-created', '-pk')
+        )
+
+    def test_post_detail_shows_newest_comments(self):
+        """На странице поста только последние COMMENTS_AMOUNT комментариев"""
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        ))
+        comments = response.context['comments']
+
+        self.assertEqual(list(comments), self.expected[:3])
+        self.assertTrue(comments.has_next())
+
+    def test_load_more_returns_fragment(self):
+        """«Показать еще» отдает только следующую порцию комментариев"""
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        seen = []
+        params = {}
+        while True:
+            response = self.guest_client.get(url, params)
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            comments = response.context['comments']
+            seen.extend(comments)
+            if not comments.has_next():
+                break
+            params = {'before': comments.paginator.older_cursor}
+
+        self.assertEqual(seen, self.expected)
+
+    def test_add_comment_redirects_to_comment(self):
+        """После отправки комментария открывается пост на новом комментарии"""
+        response = self.user_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'}
+        )
+        comment = Comment.objects.get(text='Свежий комментарий')
+
+        self.assertRedirects(
+            response,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            + f'#comment-{comment.pk}'
+        )
+        response = self.guest_client.get(response.url)
+        self.assertEqual(response.context['comments'][0], comment)
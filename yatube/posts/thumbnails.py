@@ -0,0 +1,214 @@
+"""
+Миниатюры картинок постов готовятся заранее, в фоне после сохранения
+поста. Шаблоны только читают готовую миниатюру из KV-хранилища
+sorl-thumbnail и до ее появления показывают заглушку, поэтому картинка
+никогда не уменьшается внутри запроса.
+
+Очередь живет в памяти процесса: задачи, не успевшие выполниться
+до перезапуска, доделывает команда generate_thumbnails.
+
+Файлы картинок общие для постов с одинаковым содержимым, поэтому
+файл и его миниатюры удаляются вместе с последним постом, который
+на них ссылается. Удаление и новая ссылка на файл идут под блокировкой
+строки PostImage, поэтому загрузка того же содержимого не теряет файл.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.cache import bump_versions
+
+from .cache import post_list_versions
+from .models import Post, PostImage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class PregeneratedBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, умеющий искать миниатюру без ее создания."""
+
+    def normalize_options(self, source, options):
+        # те же умолчания, что в ThumbnailBackend.get_thumbnail,
+        # иначе имя миниатюры не совпадет с созданной
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def cached_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из KV-хранилища или None."""
+        source = ImageFile(file_)
+        options = self.normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PregeneratedBackend()
+
+
+def source(image_name):
+    """Картинка поста в хранилище поля image."""
+    return ImageFile(image_name, Post._meta.get_field('image').storage)
+
+
+def formats():
+    return [
+        fmt for fmt in settings.POST_THUMBNAIL_FORMATS
+        if fmt != 'WEBP' or features.check('webp')
+    ]
+
+
+def variants():
+    """Все миниатюры: (имя, ширина, формат) -> (геометрия, параметры)."""
+    result = {}
+    for name, config in settings.POST_THUMBNAILS.items():
+        width, height = config['size']
+        for variant_width in config['widths']:
+            variant_height = round(height * variant_width / width)
+            for fmt in formats():
+                result[name, variant_width, fmt] = (
+                    f'{variant_width}x{variant_height}',
+                    {**config['options'], 'format': fmt}
+                )
+    return result
+
+
+def lookup(image, name, width=None, fmt=None):
+    """Готовая миниатюра; по умолчанию основной ширины и формата."""
+    if not image:
+        return None
+    width = width or settings.POST_THUMBNAILS[name]['size'][0]
+    fmt = fmt or formats()[-1]
+    geometry, options = variants()[name, width, fmt]
+    return backend.cached_thumbnail(image, geometry, **options)
+
+
+def picture(image, name):
+    """
+    Готовые варианты картинки для <picture>: источники по форматам
+    с srcset по ширинам. None, пока нет основной миниатюры.
+    """
+    main = lookup(image, name)
+    if main is None:
+        return None
+    config = settings.POST_THUMBNAILS[name]
+    sources = []
+    for fmt in formats():
+        srcset = []
+        for width in config['widths']:
+            thumbnail = lookup(image, name, width, fmt)
+            if thumbnail is not None:
+                srcset.append(f'{thumbnail.url} {width}w')
+        sources.append({
+            'type': f'image/{fmt.lower()}',
+            'srcset': ', '.join(srcset),
+        })
+    # последний формат отдается самим <img>
+    fallback = sources.pop()
+    return {
+        'src': main.url,
+        'srcset': fallback['srcset'],
+        'sizes': config['sizes'],
+        'width': main.width,
+        'height': main.height,
+        'sources': [source for source in sources if source['srcset']],
+    }
+
+
+def missing(image_name):
+    """True, если какой-то миниатюры картинки еще нет."""
+    image = source(image_name)
+    return any(
+        backend.cached_thumbnail(image, geometry, **options) is None
+        for geometry, options in variants().values()
+    )
+
+
+def generate(post, image_name):
+    """Создает все миниатюры картинки и обновляет страницы с постом."""
+    try:
+        for geometry, options in variants().values():
+            backend.get_thumbnail(source(image_name), geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', image_name)
+    else:
+        # заглушка уже могла попасть в кэш карточек и лент
+        bump_versions(*post_list_versions(post))
+
+
+def _generate_in_worker(post, image_name):
+    try:
+        generate(post, image_name)
+    finally:
+        # соединения с базой у потоков пула свои
+        connections.close_all()
+
+
+def _submit(post, image_name):
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post, image_name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails'
+        )
+    _executor.submit(_generate_in_worker, post, image_name)
+
+
+def schedule(post):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if post.image:
+        # копия с ключами лент: сам пост может измениться до запуска
+        target = Post(pk=post.pk, author_id=post.author_id,
+                      group_id=post.group_id)
+        image_name = post.image.name
+        transaction.on_commit(lambda: _submit(target, image_name))
+
+
+def release(image_name, storage=None):
+    """
+    Удаляет файл картинки и его миниатюры, если на него больше
+    не ссылается ни один пост. True, если файл удален.
+    """
+    if not image_name:
+        return False
+    # пока файл заблокирован, новый пост не может сослаться на него
+    with transaction.atomic():
+        PostImage.lock(image_name)
+        if Post.objects.filter(image=image_name).exists():
+            return False
+        image = (
+            ImageFile(image_name, storage) if storage else source(image_name)
+        )
+        try:
+            backend.delete(image)
+        except (OSError, SuspiciousFileOperation):
+            logger.warning('Не удалось удалить картинку %s', image_name)
+            return False
+        PostImage.objects.filter(name=image_name).delete()
+    return True
+
+
+def schedule_release(image_name):
+    """Освобождает картинку после фиксации транзакции."""
+    if image_name:
+        transaction.on_commit(lambda: release(image_name))
@@ -2,35 +2,79 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 
+from core.cache import tag_page
+
+from . import counters, etags, feeds, lookups, search
+from .cache import (INDEX_VERSION, author_posts_version, card_versions,
+                    comments_version, follow_feed_state, follows_version,
+                    group_posts_version, group_version, post_version,
+                    user_version)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Group, Post
+from .paginator import CursorPaginator
 
 
-def pages(request, posts, amount):
-    paginator = Paginator(posts, amount)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def pages(request, posts, amount, paginator_class=CursorPaginator,
+          **kwargs):
+    paginator = paginator_class(posts, amount, **kwargs)
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        before=request.GET.get('before'),
+        after=request.GET.get('after'),
+    )
     return page_obj
 
 
+def tag_cards(request, posts):
+    """Помечает страницу версиями показанных на ней карточек постов."""
+    tag_page(request, *{
+        name for post in posts for name in card_versions(post)
+    })
+
+
+def page_key(request):
+    """Параметры паджинации, от которых зависит кэш страницы ленты."""
+    return ':'.join(
+        request.GET.get(param, '') for param in ('page', 'before', 'after')
+    )
+
+
+@condition(etag_func=etags.index)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    page_obj = pages(request, posts, settings.POSTS_AMOUNT)
+    version = tag_page(request, INDEX_VERSION)[INDEX_VERSION]
+    # при попадании в кэш фрагмента лента из базы не читается
+    page_obj = SimpleLazyObject(lambda: pages(
+        request, Post.objects.select_related('author', 'group'),
+        settings.POSTS_AMOUNT, name='index'
+    ))
 
     context = {
         'main': True,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_name': 'index_page',
+        'cache_timeout': settings.INDEX_CACHE_TIMEOUT,
+        'cache_version': version,
+        'page_key': page_key(request),
     }
     return render(request, template, context)
 
 
+@condition(etag_func=etags.group_posts)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = pages(request, posts, settings.POSTS_AMOUNT)
+    group = lookups.get_group_or_404(slug)
+    tag_page(request, group_version(group.pk), group_posts_version(group.pk))
+    posts = group.posts.select_related('author', 'group')
+    page_obj = pages(
+        request, posts, settings.POSTS_AMOUNT, name=f'group:{group.pk}',
+        count=group.posts_count
+    )
+    tag_cards(request, page_obj)
 
     context = {
         'group': group,
@@ -39,10 +83,17 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@condition(etag_func=etags.profile)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = lookups.get_user_or_404(username)
+    tag_page(
+        request,
+        user_version(author.pk),
+        author_posts_version(author.pk),
+        follows_version(author.pk)
+    )
+    posts = author.posts.select_related('author', 'group')
 
     if request.user.is_authenticated:
         following = Follow.objects.filter(user=request.user,
@@ -50,21 +101,66 @@ def profile(request, username):
     else:
         following = False
 
-    page_obj = pages(request, posts, settings.POSTS_AMOUNT)
+    stats = counters.stats(author)
+    page_obj = pages(
+        request, posts, settings.POSTS_AMOUNT, name=f'profile:{author.pk}',
+        count=stats.posts_count
+    )
+    tag_cards(request, page_obj)
 
     context = {
         'following': following,
         'author': author,
+        'stats': stats,
         'page_obj': page_obj
     }
     return render(request, template, context)
 
 
+def search_posts(request):
+    """Поиск по тексту постов с фильтрами по группе и автору."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    group = request.GET.get('group', '')
+    author = request.GET.get('author', '').strip()
+    posts = Post.objects.select_related('author', 'group')
+    if group:
+        posts = posts.filter(group_id=lookups.group_id(group) or 0)
+    if author:
+        posts = posts.filter(author_id=lookups.user_id(author) or 0)
+    # по релевантности курсор не построить, поэтому обычный Paginator
+    page_obj = Paginator(
+        search.search(query, posts), settings.POSTS_AMOUNT
+    ).get_page(request.GET.get('page'))
+    params = request.GET.copy()
+    params.pop('page', None)
+
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.order_by('title').only('slug', 'title'),
+        'page_obj': page_obj,
+        'params': params.urlencode(),
+    }
+    return render(request, template, context)
+
+
+@condition(etag_func=etags.post_detail)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    tag_page(
+        request,
+        post_version(post.pk),
+        user_version(post.author_id),
+        group_version(post.group_id),
+        author_posts_version(post.author_id)
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post_comments(request, post)
 
     context = {
         'post': post,
@@ -74,6 +170,32 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def post_comments(request, post):
+    """Страница комментариев поста: сначала новые, авторы одним JOIN."""
+    tag_page(request, comments_version(post.pk))
+    page_obj = pages(
+        request, post.comments.select_related('author'),
+        settings.COMMENTS_AMOUNT, name=f'comments:{post.pk}'
+    )
+    tag_page(request, *{
+        user_version(comment.author_id) for comment in page_obj
+    })
+    return page_obj
+
+
+@condition(etag_func=etags.comments)
+def comments(request, post_id):
+    """Фрагмент со следующей порцией комментариев для «Показать еще»."""
+    template = 'includes/comment_list.html'
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+
+    context = {
+        'post': post,
+        'comments': post_comments(request, post),
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     # C какой формой будет работать этот view-класс
@@ -114,31 +236,47 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        # новый комментарий всегда на первой странице комментариев
+        return redirect(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+            + f'#comment-{comment.pk}'
+        )
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@condition(etag_func=etags.follow_index)
 def follow_index(request):
     template = 'posts/index.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = pages(request, posts, settings.POSTS_AMOUNT)
+    user_id = request.user.pk
+    version, pulled_authors = follow_feed_state(request)
+    page_obj = pages(
+        request, feeds.timeline(request.user), settings.POSTS_AMOUNT,
+        paginator_class=feeds.TimelinePaginator,
+        name=f'follow:{user_id}',
+        pulled_authors=pulled_authors
+    )
 
     context = {
         'page_obj': page_obj,
+        'cache_name': f'follow_page:{user_id}',
+        'cache_timeout': settings.FOLLOW_CACHE_TIMEOUT,
+        'cache_version': version,
+        'page_key': page_key(request),
     }
     return render(request, template, context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.get_user_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(
             user=request.user,
@@ -149,7 +287,7 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.get_user_or_404(username)
     follows = request.user.follower.all()
     follows.filter(author=author).delete()
     return redirect('posts:profile', username=username)
@@ -3,6 +3,24 @@ import os
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 POSTS_AMOUNT = 10
+COMMENTS_AMOUNT = 20
+
+# Сколько первых страниц ленты читается через OFFSET,
+# более глубокие страницы выбираются по ключу (created, id)
+PAGINATOR_OFFSET_PAGES = 10
+
+PAGINATOR_ANCHOR_TIMEOUT = 60 * 5
+
+# Больше строк списки админки не считают
+ADMIN_COUNT_LIMIT = 10000
+
+# Максимальная длина материализованной ленты подписок. Ленты, выросшие
+# от новых постов, обрезает команда prune_timelines
+TIMELINE_MAX_ENTRIES = 800
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются в ленту при чтении
+FEED_FANOUT_MAX_FOLLOWERS = 10000
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -50,6 +68,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -111,6 +130,14 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+# Имена с хэшем содержимого и сжатые копии .gz готовит collectstatic,
+# поэтому фронт-прокси может кэшировать статику бессрочно.
+# При DEBUG runserver отдает файлы из STATICFILES_DIRS как есть
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
@@ -122,8 +149,84 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Медиа проверяет Django, а отдать файл может фронт-прокси:
+# MEDIA_ACCEL_REDIRECT — префикс internal location в nginx,
+# MEDIA_SENDFILE — заголовок X-Sendfile для Apache и lighttpd
+MEDIA_ACCEL_REDIRECT = None
+
+MEDIA_SENDFILE = False
+
+# Файлы под одним именем не меняются: имя — хэш содержимого
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Фрагмент главной страницы сбрасывается сигналами, а не по времени
+INDEX_CACHE_TIMEOUT = 60 * 60 * 3
+
+# Фрагмент ленты подписок кэшируется отдельно для каждого пользователя
+FOLLOW_CACHE_TIMEOUT = 60 * 60
+
+# Карточки постов кэшируются по версиям поста, автора и группы
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько устаревший фрагмент отдается, пока один запрос его пересчитывает
+CACHE_STALE_GRACE = 60 * 5
+
+CACHE_LOCK_TIMEOUT = 30
+
+# Список pulled-авторов в ленте подписок перечитывается раз в минуту
+PULLED_AUTHORS_TIMEOUT = 60
+
+# Миниатюры картинок постов, создаются в фоне при сохранении поста:
+# каждая ширина из widths в каждом формате POST_THUMBNAIL_FORMATS
+POST_THUMBNAILS = {
+    'card': {
+        'size': (960, 339),
+        'options': {'crop': 'center', 'upscale': True},
+        'widths': (480, 960, 1440),
+        'sizes': '(max-width: 992px) 100vw, 960px',
+    },
+}
+
+# Форматы по предпочтению, последний — для браузеров без <picture>.
+# WEBP пропускается, если Pillow собран без него
+POST_THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+
+# Загрузки пишутся сразу на диск и не больше UPLOAD_MAX_BYTES
+FILE_UPLOAD_HANDLERS = ['core.uploads.BoundedUploadHandler']
+
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+
+# Больше пикселей картинка не декодируется: память на нее предсказуема
+POST_IMAGE_MAX_PIXELS = 6000 * 4000
+
+# Потоков для создания миниатюр; 0 — сразу после фиксации транзакции
+THUMBNAIL_WORKERS = 2
+
+# Поиск групп и пользователей по имени; неизвестные имена помнятся минуту
+LOOKUP_CACHE_TIMEOUT = 60 * 60 * 24
+
+LOOKUP_MISS_TIMEOUT = 60
+
+# Страницы для анонимов сбрасываются по тегам, срок нужен для вытеснения
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Горячие ключи читаются из памяти процесса, общий уровень виден всем
+# процессам. В продакшене SHARED указывает на memcached или redis
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'STAMP_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }